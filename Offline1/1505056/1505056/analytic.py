@@ -0,0 +1,61 @@
+"""
+Closed-form results for the Markovian queues of the Offline1 experiments.
+
+mm1 and mmk return (Lq, Wq, util, Pwait) for an M/M/1 queue and for an M/M/k
+queue with one shared FCFS line (Erlang C). Results are memoized per
+(lambd, mu, k), so sweeps can call them for every point at no cost.
+analyticResults maps a Params object to the (avgQlength, avgQdelay, util)
+tuple of States.getResults, or None where no closed form exists, so a driver
+only has to simulate the configurations it gets None for.
+"""
+
+from functools import lru_cache
+
+
+def erlangB(a, k:int):
+    # Erlang B blocking probability with offered load a = lambd/mu and k
+    # servers, by the recursion B(j) = a*B(j-1) / (j + a*B(j-1)). Every step
+    # stays in [0, 1], so it is stable for thousands of servers where the
+    # factorial formula overflows.
+    b = 1.0
+    for j in range(1, k + 1):
+        b = a * b / (j + a * b)
+    return b
+
+
+def erlangC(a, k:int):
+    # Probability that an arrival has to wait in an M/M/k queue (Erlang C).
+    if a >= k:
+        return 1.0
+    b = erlangB(a, k)
+    return k * b / (k - a * (1.0 - b))
+
+
+@lru_cache(maxsize=None)
+def mmk(lambd, mu, k:int):
+    # (Lq, Wq, util, Pwait) of an M/M/k queue with a single shared line.
+    # An unstable queue (lambd >= k*mu) has infinite Lq and Wq.
+    if lambd <= 0 or mu <= 0 or k < 1:
+        raise ValueError('mmk needs lambd > 0, mu > 0 and k >= 1')
+    a = lambd / mu
+    rho = a / k
+    if rho >= 1.0:
+        return (float('inf'), float('inf'), 1.0, 1.0)
+    pWait = erlangC(a, k)
+    lq = pWait * rho / (1.0 - rho)
+    return (lq, lq / lambd, rho, pWait)
+
+
+def mm1(lambd, mu):
+    # (Lq, Wq, util, Pwait) of an M/M/1 queue: Lq = rho^2/(1-rho), Pwait = rho.
+    return mmk(lambd, mu, 1)
+
+
+def analyticResults(params):
+    # Exact (avgQlength, avgQdelay, util) for a Params, or None when the
+    # configuration (several queues with jockeying, experiment_4) has no
+    # closed form and must be simulated.
+    if params.queueNo != 1:
+        return None
+    lq, wq, util, pWait = mmk(params.lambd, params.mu, params.k)
+    return (lq, wq, util)
@@ -6,18 +6,35 @@ ro is defined as the ratio of arrival rate vs service rate.
 For the sake of comparison, while plotting results from simulation, also produce the analytical results.
 """
 
-import heapq
+import itertools
 import random
+from collections import deque
 import matplotlib.pyplot as plt
 from lcgrand import MODLUS
 from lcgrand import MULT1
 from lcgrand import MULT2
-from lcgrand import zrng
-from lcgrand import lcgrand
+from lcgrand import RandomStream
+from lcgrand import VariatePool
+from fel import HeapFEL
+from analytic import analyticResults
 import math
 IDLE = 0
 BUSY = 1
 
+#integer event type codes, cheaper to compare than strings
+START = 0
+ARRIVAL = 1
+DEPART = 2
+EXIT = 3
+EVENT_NAMES = ['START', 'ARRIVAL', 'DEPART', 'EXIT']
+
+
+def newEventType(name):
+    #add an event type (breakdown, reneging, shift change...) and return its code;
+    #give it a handler with Simulator.registerEvent
+    EVENT_NAMES.append(name)
+    return len(EVENT_NAMES) - 1
+
 
 # Parameters
 class Params:
@@ -37,6 +54,8 @@ class States:
         # States
         self.queue = [] #this queue stores the arrival times
         self.status = [] #this holds the status of k servers
+        self.busyServers = 0 #number of BUSY entries in status, counted where a server changes status
+        self.freeServers = 0 #free-server pool as a bitset: bit i is set while server i is IDLE
         self.numInQ = 0.0
         self.timeLastEvent = 0.0
         
@@ -54,7 +73,7 @@ class States:
 
     def update(self, sim, event):
         #if the event is the START event
-        if event.eventType == 'START':
+        if event.eventType == START:
             return
 
         timeSincelastEvent = event.eventTime - self.timeLastEvent
@@ -65,11 +84,7 @@ class States:
         self.areaNumInQ += (self.numInQ * timeSincelastEvent)
 
         #update area under server-busy indicator function
-        busyServers = 0
-        for i in range(sim.params.k):
-            if self.status[i]==BUSY:
-                busyServers += 1
-        self.areaServerStatus += ((busyServers/sim.params.k) * timeSincelastEvent)
+        self.areaServerStatus += ((self.busyServers/sim.params.k) * timeSincelastEvent)
         
 
     def finish(self, sim):
@@ -93,24 +108,38 @@ class States:
 
     def initStatus(self, k:int):
         self.status = []
+        self.busyServers = 0
         i=0
         while i<k:
             self.status.append(IDLE)
             i+=1
+        self.freeServers = (1 << k) - 1
 
     def checkStatus(self, k):
-        i=0
-        while i<k:
-            if self.status[i]==IDLE:
-                return i
-            i+=1
-        return -1
+        #the lowest-numbered IDLE server, or -1 if all are busy: find-first-set on the free-server bitset,
+        #so the cost does not grow with k the way a scan of status does
+        free = self.freeServers
+        if free == 0:
+            return -1
+        return (free & -free).bit_length() - 1
+
+    def seizeServer(self, i:int):
+        #server i starts serving
+        self.status[i] = BUSY
+        self.busyServers += 1
+        self.freeServers ^= 1 << i
+
+    def releaseServer(self, i:int):
+        #server i becomes IDLE
+        self.status[i] = IDLE
+        self.busyServers -= 1
+        self.freeServers |= 1 << i
 
     def initQueue(self, k:int):
         self.queue = []
         i=0
         while i<k:
-            self.queue.append([])
+            self.queue.append(deque()) #O(1) append and pop at both ends
 
             i+=1
     
@@ -119,23 +148,23 @@ class States:
 
 
 class Event:
-    def __init__(self, sim):
-        self.eventType = None
-        self.sim = sim
-        self.eventTime = None
+    #slots keep events small; the type code lives on the class, not in every event
+    __slots__ = ('eventTime',)
+    eventType = None
+
+    def __init__(self, eventTime, sim):
+        self.eventTime = eventTime
 
     def process(self, sim):
         raise Exception('Unimplemented process method for the event!')
 
     def __repr__(self):
-        return self.eventType
+        return EVENT_NAMES[self.eventType]
 
 
 class StartEvent(Event):
-    def __init__(self, eventTime, sim):
-        self.eventTime = eventTime
-        self.eventType = 'START'
-        self.sim = sim
+    __slots__ = ()
+    eventType = START
 
     def process(self, sim):
         # this is the startEvent. It will enqueue an arrival event
@@ -147,21 +176,16 @@ class StartEvent(Event):
 
 
 class ExitEvent(Event):
-    def __init__(self, eventTime, sim):
-        self.eventTime = eventTime
-        self.eventType = 'EXIT'
-        self.sim = sim
+    __slots__ = ()
+    eventType = EXIT
 
     def process(self, sim):
         None
 
 
 class ArrivalEvent(Event):
-    # Write __init__ function
-    def __init__(self, eventTime ,sim):
-        self.eventTime = eventTime
-        self.sim = sim
-        self.eventType = 'ARRIVAL'
+    __slots__ = ()
+    eventType = ARRIVAL
 
     def process(self, sim):
         #schedule the next arrival
@@ -171,7 +195,7 @@ class ArrivalEvent(Event):
         sim.scheduleEvent(ArrivalEvent(nextArrival, sim))
 
         #check to see if any server is idle
-        freeServer = sim.states.checkStatus(self.sim.params.k)
+        freeServer = sim.states.checkStatus(sim.params.k)
         if freeServer == -1:
             sim.states.numInQ += 1
             #if all the servers are busy, then put the event in the leftmost shortest queue
@@ -186,7 +210,7 @@ class ArrivalEvent(Event):
 
             #increment the number of customers served and make server busy
             sim.states.served += 1
-            sim.states.status[freeServer] = BUSY
+            sim.states.seizeServer(freeServer)
 
             #create the departure event for this arrival
             temp= sim.expon(1/sim.params.mu)
@@ -196,11 +220,11 @@ class ArrivalEvent(Event):
 
 
 class DepartureEvent(Event):
-    
+    __slots__ = ('serverNo',)
+    eventType = DEPART
+
     def __init__(self, eventTime, sim, serverNo:int):
         self.eventTime = eventTime
-        self.eventType = 'DEPART'
-        self.sim = sim
         self.serverNo = serverNo
 
 
@@ -209,7 +233,7 @@ class DepartureEvent(Event):
 
         if len(sim.states.queue[0])==0:
                 #sim.states.initStatus(sim.params.k)
-                sim.states.status[self.serverNo] = IDLE
+                sim.states.releaseServer(self.serverNo)
 
 
         else:
@@ -230,7 +254,7 @@ class DepartureEvent(Event):
             
             departureTime = sim.simclock + temp
             sim.scheduleEvent(DepartureEvent(departureTime, sim, self.serverNo))
-            sim.states.queue[0] = sim.states.queue[0][1:]
+            sim.states.queue[0].popleft()
             
 
 
@@ -238,15 +262,37 @@ class DepartureEvent(Event):
 
 
 class Simulator:
-    def __init__(self, seed):
-        self.eventQ = [] #this stores the arrival and departure events
+    def __init__(self, seed, rng=None, fel=None, slots=False):
+        #the future event list stores the arrival and departure events; a binary heap unless another list is given
+        self.eventQ = fel if fel is not None else HeapFEL()
+        self.eventSeq = itertools.count() #sequence numbers break ties between events at the same time
+        #dispatch table: event type code -> handler(event, sim)
+        self.handlers = []
+        self.registerEvent(START, StartEvent.process)
+        self.registerEvent(ARRIVAL, ArrivalEvent.process)
+        self.registerEvent(DEPART, DepartureEvent.process)
         self.simclock = 0
         self.seed = seed
+        #every simulator owns its random stream; by default it starts at the seed of lcgrand stream 1
+        self.rng = rng if rng is not None else RandomStream()
+        #expon and erlang read their draws from pre-filled blocks of this stream
+        self.variates = VariatePool(self.rng)
         self.params = None
         self.states = None
+        #slots=True runs without an event list: every event that can be pending gets a fixed slot (see runSlots)
+        self.slots = slots
+        self.slotTimes = None
+        self.slotEvents = None
+        self.departSlot = 0
 
     def initialize(self):
         self.simclock = 0
+        if self.slots:
+            #one slot per event type, then one departure slot per server
+            self.departSlot = len(EVENT_NAMES)
+            self.slotTimes = [math.inf] * (self.departSlot + self.params.k)
+            self.slotEvents = [None] * (self.departSlot + self.params.k)
+            self.scheduleEvent = self.scheduleSlot
         self.states.initStatus(self.params.k)
         self.states.initQueue(self.params.queueNo)
         # print(self.states.queue)
@@ -259,30 +305,80 @@ class Simulator:
     def now(self):
         return self.simclock
 
+    def registerEvent(self, eventType:int, handler):
+        #handler(event, sim) runs for every event of this type, right after States.update
+        while len(self.handlers) <= eventType:
+            self.handlers.append(None)
+        self.handlers[eventType] = handler
+
     def scheduleEvent(self, event):
-        #heapq is a priority queue
-        heapq.heappush(self.eventQ, (event.eventTime, event))
+        self.eventQ.push((event.eventTime, next(self.eventSeq), event))
+
+    def scheduleSlot(self, event):
+        #scheduleEvent of slot mode: the event takes the slot of its type, a departure the slot of its server.
+        #The model never has two events of a slot pending, so the slot is always free here
+        eventType = event.eventType
+        if eventType == DEPART:
+            slot = self.departSlot + event.serverNo
+        else:
+            slot = eventType
+        self.slotTimes[slot] = event.eventTime
+        self.slotEvents[slot] = event
 
     def run(self):
         random.seed(self.seed)
         self.initialize()
+        if self.slots:
+            self.runSlots()
+        else:
+            self.runEventList()
+        self.states.finish(self)
 
-        while len(self.eventQ) > 0:
-            time, event = heapq.heappop(self.eventQ)
+    def runEventList(self):
+        #the loop only touches locals: pop, update the statistics, dispatch on the type code
+        eventQ = self.eventQ
+        pop = eventQ.pop
+        handlers = self.handlers
+        update = self.states.update
+        while eventQ:
+            time, seq, event = pop()
             
-            if event.eventType == 'EXIT':
+            eventType = event.eventType
+            if eventType == EXIT:
                 # event.process(self)
                 break
 
             #states are the performance matrices i.e. avg_q_len, avg_delay etc
-            if self.states != None:
-                self.states.update(self, event)
+            update(self, event)
 
             # print(event.eventTime, 'Event', event)
-            self.simclock = event.eventTime
-            event.process(self)
+            self.simclock = time
+            handlers[eventType](event, self)
+
+    def runSlots(self):
+        #the next-event-time loop of the C reference (time_next_event[] and timing()): at most k+2 events
+        #are ever pending, so the next one is found by scanning a flat list of slot times (inf when empty)
+        #instead of keeping a heap of (time, seq, event) tuples. Ties go to the lower slot.
+        times = self.slotTimes
+        events = self.slotEvents
+        inf = math.inf
+        handlers = self.handlers
+        update = self.states.update
+        while True:
+            time = min(times)
+            if time == inf:
+                break
+            slot = times.index(time)
+            times[slot] = inf
+            event = events[slot]
 
-        self.states.finish(self)
+            eventType = event.eventType
+            if eventType == EXIT:
+                break
+
+            update(self, event)
+            self.simclock = time
+            handlers[eventType](event, self)
 
     def printResults(self):
         self.states.printResults(self)
@@ -291,7 +387,7 @@ class Simulator:
         return self.states.getResults(self)
 
     def expon(self, mean):
-        return (-mean * math.log(lcgrand(1)))
+        return self.variates.expon(mean)
         # return random.expovariate(1/mean)
 
 
@@ -304,11 +400,10 @@ def experiment1():
         
     print("\n\nAnalytic Results")
     #Analytical Results
-    l = sim.params.lambd
-    m = sim.params.mu
-    print(f'Average Queue Length: {(l*l)/(m*(m-l))}')
-    print(f'Average Delay in Queue: {l/(m*(m-l))}')
-    print(f'Average Queue Length: {l/m}')
+    length, delay, utl = analyticResults(sim.params)
+    print(f'Average Queue Length: {length}')
+    print(f'Average Delay in Queue: {delay}')
+    print(f'Server Utilization: {utl}')
 
 
 def main():
@@ -6,26 +6,62 @@ ro is defined as the ratio of arrival rate vs service rate.
 For the sake of comparison, while plotting results from simulation, also produce the analytical results.
 """
 
-import heapq
+import itertools
+import warnings
 import random
+from functools import partial
+from collections import deque
 import matplotlib.pyplot as plt
 from lcgrand import MODLUS
 from lcgrand import MULT1
 from lcgrand import MULT2
-from lcgrand import zrng
-from lcgrand import lcgrand
+from lcgrand import RandomStream
+from lcgrand import VariatePool
+from lcgrand import VARIATE_BLOCK
+from lcgrand import lcgrandsub
+from fel import HeapFEL
+from warmup import BATCH
+from warmup import mserTruncation
+from warmup import pilotStream
+from warmup import TruncationError
+from parallel import runSweep
+from analysis import ratioInterval
+from parallel import runToPrecision
+from analytic import analyticResults
+from vectorized import mm1Replications
+from vectorized import mm1Sweep
 import math
+import numpy as np
 IDLE = 0
 BUSY = 1
 
+#integer event type codes, cheaper to compare than strings
+START = 0
+ARRIVAL = 1
+DEPART = 2
+EXIT = 3
+EVENT_NAMES = ['START', 'ARRIVAL', 'DEPART', 'EXIT']
+
+
+def newEventType(name):
+    #add an event type (breakdown, reneging, shift change...) and return its code;
+    #give it a handler with Simulator.registerEvent
+    EVENT_NAMES.append(name)
+    return len(EVENT_NAMES) - 1
+
+
+WARMUP = newEventType('WARMUP') #end of the warm-up period, when the statistics restart
+
 
 # Parameters
 class Params:
-    def __init__(self, lambd, mu, k, q):
+    def __init__(self, lambd, mu, k, q, endTime=10000, warmupTime=0.0):
         self.lambd = lambd  # interarrival rate
         self.mu = mu  # service rate
         self.k = k
         self.queueNo = q
+        self.endTime = endTime  # length of the run
+        self.warmupTime = warmupTime  # statistics are collected from here on (see detectWarmup)
     # Note lambd and mu are not mean value, they are rates i.e. (1/mean)
 
 # Write more functions if required
@@ -33,10 +69,12 @@ class Params:
 
 # States and statistical counters
 class States:
-    def __init__(self):
+    def __init__(self, recordWarmup=False, regenerative=False):
         # States
         self.queue = [] #this queue stores the arrival times
         self.status = [] #this holds the status of k servers
+        self.busyServers = 0 #number of BUSY entries in status, counted where a server changes status
+        self.freeServers = 0 #free-server pool as a bitset: bit i is set while server i is IDLE
         self.numInQ = 0.0
         self.timeLastEvent = 0.0
         
@@ -50,11 +88,22 @@ class States:
         self.avgQdelay = 0.0
         self.avgQlength = 0.0
         self.served = 0 #customers delayed
+        self.warmupTime = 0.0 #the statistics cover the run from here on
+
+        #warm-up detection (MSER-5, see warmup.py): with recordWarmup, the accumulators are saved every
+        #BATCH customers delayed, and finish finds the end of the warm-up, warmupEnd, from them
+        self.nextCheckpoint = BATCH if recordWarmup else -1
+        self.checkpoints = [(0.0, 0.0, 0.0)] #(time, totalDelay, areaNumInQ)
+        self.warmupEnd = 0.0
+
+        #regenerative mode: the accumulators at every arrival to an empty system, where a cycle starts
+        self.regenerative = regenerative
+        self.regenerations = [] #(time, totalDelay, served, areaNumInQ, areaServerStatus)
 
 
     def update(self, sim, event):
         #if the event is the START event
-        if event.eventType == 'START':
+        if event.eventType == START:
             return
 
         timeSincelastEvent = event.eventTime - self.timeLastEvent
@@ -65,18 +114,54 @@ class States:
         self.areaNumInQ += (self.numInQ * timeSincelastEvent)
 
         #update area under server-busy indicator function
-        busyServers = 0
-        for i in range(sim.params.k):
-            if self.status[i]==BUSY:
-                busyServers += 1
-        self.areaServerStatus += ((busyServers/sim.params.k) * timeSincelastEvent)
+        self.areaServerStatus += ((self.busyServers/sim.params.k) * timeSincelastEvent)
         
 
+    def regenerate(self, now):
+        #the system is empty and a customer arrives: the last cycle ends here; update ran for this event
+        self.regenerations.append((now, self.totalDelay, self.served, self.areaNumInQ, self.areaServerStatus))
+
+    def cycleSums(self):
+        #one row per complete cycle: its length, total delay, customers delayed, area under the number in
+        #queue and under the busy fraction of the servers; the time before the first cycle and the cycle
+        #still open at the end are left out
+        return np.diff(np.array(self.regenerations, dtype=np.float64).reshape(-1, 5), axis=0)
+
+    def restart(self, now):
+        #drop everything collected so far; update has brought the areas up to now
+        self.totalDelay = 0.0
+        self.areaNumInQ = 0.0
+        self.areaServerStatus = 0.0
+        self.served = 0
+        self.warmupTime = now
+
+    def checkpoint(self, now):
+        #called when served reaches nextCheckpoint; the areas are up to date, as update ran for this event
+        self.checkpoints.append((now, self.totalDelay, self.areaNumInQ))
+        self.nextCheckpoint += BATCH
+
+    def findWarmupEnd(self, fixedWarmup):
+        #batch means of the delay and of the queue length between checkpoints; the warm-up ends at the
+        #later of the two MSER truncation points, or at fixedWarmup if MSER cannot tell (see warmup.py)
+        points = self.checkpoints
+        delays = [(b[1] - a[1]) / BATCH for a, b in zip(points, points[1:])]
+        lengths = [(b[2] - a[2]) / (b[0] - a[0]) if b[0] > a[0] else 0.0 for a, b in zip(points, points[1:])]
+        try:
+            d = max(mserTruncation(delays), mserTruncation(lengths))
+        except TruncationError as error:
+            warnings.warn('%s; keeping the fixed warm-up of %f sec' % (error, fixedWarmup))
+            self.warmupEnd = fixedWarmup
+            return
+        self.warmupEnd = points[d][0]
+
     def finish(self, sim):
         # print(f'total Delay: {self.totalDelay}')
+        if self.nextCheckpoint != -1:
+            self.findWarmupEnd(sim.params.warmupTime)
+        runTime = sim.simclock - self.warmupTime
         self.avgQdelay = self.totalDelay/self.served
-        self.avgQlength = (self.areaNumInQ/sim.simclock)/sim.params.queueNo
-        self.util = self.areaServerStatus/sim.simclock
+        self.avgQlength = (self.areaNumInQ/runTime)/sim.params.queueNo
+        self.util = self.areaServerStatus/runTime
 
     def printResults(self, sim):
         
@@ -93,24 +178,38 @@ class States:
 
     def initStatus(self, k:int):
         self.status = []
+        self.busyServers = 0
         i=0
         while i<k:
             self.status.append(IDLE)
             i+=1
+        self.freeServers = (1 << k) - 1
 
     def checkStatus(self, k):
-        i=0
-        while i<k:
-            if self.status[i]==IDLE:
-                return i
-            i+=1
-        return -1
+        #the lowest-numbered IDLE server, or -1 if all are busy: find-first-set on the free-server bitset,
+        #so the cost does not grow with k the way a scan of status does
+        free = self.freeServers
+        if free == 0:
+            return -1
+        return (free & -free).bit_length() - 1
+
+    def seizeServer(self, i:int):
+        #server i starts serving
+        self.status[i] = BUSY
+        self.busyServers += 1
+        self.freeServers ^= 1 << i
+
+    def releaseServer(self, i:int):
+        #server i becomes IDLE
+        self.status[i] = IDLE
+        self.busyServers -= 1
+        self.freeServers |= 1 << i
 
     def initQueue(self, k:int):
         self.queue = []
         i=0
         while i<k:
-            self.queue.append([])
+            self.queue.append(deque()) #O(1) append and pop at both ends
 
             i+=1
     
@@ -119,49 +218,55 @@ class States:
 
 
 class Event:
-    def __init__(self, sim):
-        self.eventType = None
-        self.sim = sim
-        self.eventTime = None
+    #slots keep events small; the type code lives on the class, not in every event
+    __slots__ = ('eventTime',)
+    eventType = None
+
+    def __init__(self, eventTime, sim):
+        self.eventTime = eventTime
 
     def process(self, sim):
         raise Exception('Unimplemented process method for the event!')
 
     def __repr__(self):
-        return self.eventType
+        return EVENT_NAMES[self.eventType]
 
 
 class StartEvent(Event):
-    def __init__(self, eventTime, sim):
-        self.eventTime = eventTime
-        self.eventType = 'START'
-        self.sim = sim
+    __slots__ = ()
+    eventType = START
 
     def process(self, sim):
         # this is the startEvent. It will enqueue an arrival event
         firstArrivalTime = self.eventTime + sim.expon(1/sim.params.lambd)
         sim.scheduleEvent(ArrivalEvent(firstArrivalTime, sim))
-        sim.scheduleEvent(ExitEvent(10000, sim))
+        sim.scheduleEvent(ExitEvent(sim.params.endTime, sim))
+        if sim.params.warmupTime > 0:
+            sim.scheduleEvent(WarmupEvent(sim.params.warmupTime, sim))
         
         
 
 
 class ExitEvent(Event):
-    def __init__(self, eventTime, sim):
-        self.eventTime = eventTime
-        self.eventType = 'EXIT'
-        self.sim = sim
+    __slots__ = ()
+    eventType = EXIT
 
     def process(self, sim):
         None
 
 
+class WarmupEvent(Event):
+    __slots__ = ()
+    eventType = WARMUP
+
+    def process(self, sim):
+        #the warm-up is over: the statistics restart from here
+        sim.states.restart(sim.simclock)
+
+
 class ArrivalEvent(Event):
-    # Write __init__ function
-    def __init__(self, eventTime ,sim):
-        self.eventTime = eventTime
-        self.sim = sim
-        self.eventType = 'ARRIVAL'
+    __slots__ = ()
+    eventType = ARRIVAL
 
     def process(self, sim):
         #schedule the next arrival
@@ -171,7 +276,7 @@ class ArrivalEvent(Event):
         sim.scheduleEvent(ArrivalEvent(nextArrival, sim))
 
         #check to see if any server is idle
-        freeServer = sim.states.checkStatus(self.sim.params.k)
+        freeServer = sim.states.checkStatus(sim.params.k)
         if freeServer == -1:
             sim.states.numInQ += 1
             #if all the servers are busy, then put the event in the leftmost shortest queue
@@ -180,13 +285,17 @@ class ArrivalEvent(Event):
             # print(sim.states.queue)
             # print("here")
         else:
+            if sim.states.busyServers == 0 and sim.states.regenerative:
+                sim.states.regenerate(sim.simclock)
             delay = 0.0
             sim.states.totalDelay += delay
             # print(f'delay: {delay}')
 
             #increment the number of customers served and make server busy
             sim.states.served += 1
-            sim.states.status[freeServer] = BUSY
+            if sim.states.served == sim.states.nextCheckpoint:
+                sim.states.checkpoint(sim.simclock)
+            sim.states.seizeServer(freeServer)
 
             #create the departure event for this arrival
             temp= sim.expon(1/sim.params.mu)
@@ -196,11 +305,11 @@ class ArrivalEvent(Event):
 
 
 class DepartureEvent(Event):
-    
+    __slots__ = ('serverNo',)
+    eventType = DEPART
+
     def __init__(self, eventTime, sim, serverNo:int):
         self.eventTime = eventTime
-        self.eventType = 'DEPART'
-        self.sim = sim
         self.serverNo = serverNo
 
 
@@ -209,7 +318,7 @@ class DepartureEvent(Event):
 
         if len(sim.states.queue[0])==0:
                 #sim.states.initStatus(sim.params.k)
-                sim.states.status[self.serverNo] = IDLE
+                sim.states.releaseServer(self.serverNo)
 
 
         else:
@@ -225,24 +334,49 @@ class DepartureEvent(Event):
 
             #increment the number of customers served and schedule departure
             sim.states.served += 1
+            if sim.states.served == sim.states.nextCheckpoint:
+                sim.states.checkpoint(sim.simclock)
             temp= sim.expon(1/sim.params.mu)
             # print(temp)
             departureTime = sim.simclock + temp
             sim.scheduleEvent(DepartureEvent(departureTime, sim, self.serverNo))
 
             #move everyone in the queue one step up
-            sim.states.queue[0] = sim.states.queue[0][1:]
+            sim.states.queue[0].popleft()
 
 class Simulator:
-    def __init__(self, seed):
-        self.eventQ = [] #this stores the arrival and departure events
+    def __init__(self, seed, rng=None, fel=None, slots=False):
+        #the future event list stores the arrival and departure events; a binary heap unless another list is given
+        self.eventQ = fel if fel is not None else HeapFEL()
+        self.eventSeq = itertools.count() #sequence numbers break ties between events at the same time
+        #dispatch table: event type code -> handler(event, sim)
+        self.handlers = []
+        self.registerEvent(START, StartEvent.process)
+        self.registerEvent(ARRIVAL, ArrivalEvent.process)
+        self.registerEvent(DEPART, DepartureEvent.process)
+        self.registerEvent(WARMUP, WarmupEvent.process)
         self.simclock = 0
         self.seed = seed
+        #every simulator owns its random stream; by default it starts at the seed of lcgrand stream 1
+        self.rng = rng if rng is not None else RandomStream()
+        #expon and erlang read their draws from pre-filled blocks of this stream
+        self.variates = VariatePool(self.rng)
         self.params = None
         self.states = None
+        #slots=True runs without an event list: every event that can be pending gets a fixed slot (see runSlots)
+        self.slots = slots
+        self.slotTimes = None
+        self.slotEvents = None
+        self.departSlot = 0
 
     def initialize(self):
         self.simclock = 0
+        if self.slots:
+            #one slot per event type, then one departure slot per server
+            self.departSlot = len(EVENT_NAMES)
+            self.slotTimes = [math.inf] * (self.departSlot + self.params.k)
+            self.slotEvents = [None] * (self.departSlot + self.params.k)
+            self.scheduleEvent = self.scheduleSlot
         self.states.initStatus(self.params.k)
         self.states.initQueue(self.params.queueNo)
         # print(self.states.queue)
@@ -255,30 +389,80 @@ class Simulator:
     def now(self):
         return self.simclock
 
+    def registerEvent(self, eventType:int, handler):
+        #handler(event, sim) runs for every event of this type, right after States.update
+        while len(self.handlers) <= eventType:
+            self.handlers.append(None)
+        self.handlers[eventType] = handler
+
     def scheduleEvent(self, event):
-        #heapq is a priority queue
-        heapq.heappush(self.eventQ, (event.eventTime, event))
+        self.eventQ.push((event.eventTime, next(self.eventSeq), event))
+
+    def scheduleSlot(self, event):
+        #scheduleEvent of slot mode: the event takes the slot of its type, a departure the slot of its server.
+        #The model never has two events of a slot pending, so the slot is always free here
+        eventType = event.eventType
+        if eventType == DEPART:
+            slot = self.departSlot + event.serverNo
+        else:
+            slot = eventType
+        self.slotTimes[slot] = event.eventTime
+        self.slotEvents[slot] = event
 
     def run(self):
         random.seed(self.seed)
         self.initialize()
+        if self.slots:
+            self.runSlots()
+        else:
+            self.runEventList()
+        self.states.finish(self)
 
-        while len(self.eventQ) > 0:
-            time, event = heapq.heappop(self.eventQ)
-
-            if event.eventType == 'EXIT':
+    def runEventList(self):
+        #the loop only touches locals: pop, update the statistics, dispatch on the type code
+        eventQ = self.eventQ
+        pop = eventQ.pop
+        handlers = self.handlers
+        update = self.states.update
+        while eventQ:
+            time, seq, event = pop()
+
+            eventType = event.eventType
+            if eventType == EXIT:
                 # event.process(self)
                 break
 
             #states are the performance matrices i.e. avg_q_len, avg_delay etc
-            if self.states != None:
-                self.states.update(self, event)
+            update(self, event)
 
             # print(event.eventTime, 'Event', event)
-            self.simclock = event.eventTime
-            event.process(self)
+            self.simclock = time
+            handlers[eventType](event, self)
+
+    def runSlots(self):
+        #the next-event-time loop of the C reference (time_next_event[] and timing()): at most k+2 events
+        #are ever pending, so the next one is found by scanning a flat list of slot times (inf when empty)
+        #instead of keeping a heap of (time, seq, event) tuples. Ties go to the lower slot.
+        times = self.slotTimes
+        events = self.slotEvents
+        inf = math.inf
+        handlers = self.handlers
+        update = self.states.update
+        while True:
+            time = min(times)
+            if time == inf:
+                break
+            slot = times.index(time)
+            times[slot] = inf
+            event = events[slot]
 
-        self.states.finish(self)
+            eventType = event.eventType
+            if eventType == EXIT:
+                break
+
+            update(self, event)
+            self.simclock = time
+            handlers[eventType](event, self)
 
     def printResults(self):
         self.states.printResults(self)
@@ -287,11 +471,55 @@ class Simulator:
         return self.states.getResults(self)
 
     def expon(self, mean):
-        return (-mean * math.log(lcgrand(1)))
+        return self.variates.expon(mean)
         # return random.expovariate(1/mean)
 
 
-def experiment2():
+def runCell(params, seed=101):
+    #one cell of a sweep, run in a worker process by runSweep: every cell starts from the same seed,
+    #as in the serial loop, and the finished States (all of its statistics) go back to the parent
+    sim = Simulator(seed)
+    sim.configure(params, States())
+    sim.run()
+    return sim.states
+
+
+def runCycles(params, task:int):
+    #the regeneration cycles of one independent run of params, drawing from lcgrand substream `task`
+    sim = Simulator(101, rng=RandomStream(lcgrandsub(task)))
+    sim.configure(params, States(regenerative=True))
+    sim.run()
+    return sim.states.cycleSums()
+
+
+def regenerativeResults(params, tasks=8, level=0.95, workers=None):
+    #steady-state (avgQlength, avgQdelay, util) of params with confidence half-widths, by the regenerative
+    #method: the cycles of `tasks` independent runs, generated in parallel, are i.i.d., so they are pooled
+    #into ratio estimators with no warm-up to drop. Returns (cycles, results, halfWidths)
+    cycles = np.vstack(runSweep(partial(runCycles, params), range(tasks), workers=workers))
+    time, delay, served, areaNumInQ, areaServerStatus = cycles.T
+    results, halfWidths = ratioInterval(np.column_stack((areaNumInQ / params.queueNo, delay, areaServerStatus)),
+                                        np.column_stack((time, served, time)), level)
+    return len(cycles), results, halfWidths
+
+
+def detectWarmup(params, seed=None):
+    #end of the warm-up of params, found by MSER-5 on a pilot run. The pilot draws from a substream of its
+    #own (see warmup.pilotStream), so the truncation point does not depend on the run it is applied to;
+    #taken from the very run it truncates, it biases the estimates low, as MSER then tends to cut right
+    #after a congested stretch. If MSER cannot tell, the fixed params.warmupTime is kept, with a warning.
+    #pilotStream checks that the pilot fits in its substream: every customer takes an interarrival and a
+    #service time, and the pool reads at most VARIATE_BLOCK ahead
+    rng = RandomStream(seed) if seed is not None else pilotStream(2 * params.lambd * params.endTime + VARIATE_BLOCK)
+    sim = Simulator(101, rng=rng)
+    sim.configure(params, States(recordWarmup=True))
+    sim.run()
+    return sim.states.warmupEnd
+
+
+def experiment2(endTime=10000, truncate=False):
+    #endTime sets the length of every run; with truncate, every run drops its warm-up (detectWarmup)
+    #from the statistics, so that shorter runs still estimate the steady state
     #seed = 110
     seed = 101
     mu = 1000.0 / 60
@@ -300,40 +528,150 @@ def experiment2():
     avglength = []
     avgdelay = []
     util = []
-
+    analytic = [] #exact M/M/k values for comparison
+
+    #the ro points run in parallel worker processes
+    cells = [Params(mu * ro, mu, 1, 1, endTime) for ro in ratios]
+    if truncate:
+        #a pilot run per cell finds where its warm-up ends
+        for params, warmupTime in zip(cells, runSweep(detectWarmup, cells)):
+            params.warmupTime = warmupTime
     i=1
-    for ro in ratios:
+    for params, states in zip(cells, runSweep(partial(runCell, seed=seed), cells)):
         print(f"iteration {i}")
-        zrng[1] = 1973272912
+        if truncate:
+            print('warm-up: %f sec' % params.warmupTime)
         sim = Simulator(seed)
-        sim.configure(Params(mu * ro, mu, 1, 1), States())
-        sim.run()
+        sim.configure(params, states) #the finished statistics of this point
 
         length, delay, utl = sim.getResults()
         avglength.append(length)
         avgdelay.append(delay)
         util.append(utl)
         i+=1
+        analytic.append(analyticResults(sim.params))
 
     plt.figure(1)
     plt.subplot(311)
-    plt.plot(ratios, avglength)
+    plt.plot(ratios, avglength, label='simulation')
+    plt.plot(ratios, [a[0] for a in analytic], '--', label='analytic')
+    plt.legend()
     plt.xlabel('Ratio (ro)')
     plt.ylabel('Avg Q length')
 
     plt.subplot(312)
-    plt.plot(ratios, avgdelay)
+    plt.plot(ratios, avgdelay, label='simulation')
+    plt.plot(ratios, [a[1] for a in analytic], '--', label='analytic')
+    plt.legend()
     plt.xlabel('Ratio (ro)')
     plt.ylabel('Avg Q delay (sec)')
 
     plt.subplot(313)
-    plt.plot(ratios, util)
+    plt.plot(ratios, util, label='simulation')
+    plt.plot(ratios, [a[2] for a in analytic], '--', label='analytic')
+    plt.legend()
     plt.xlabel('Ratio (ro)')
     plt.ylabel('Util')
 
     plt.show()
 
 
+def experiment2Replicated(replications=30):
+    # Same sweep as experiment2, but every ro point runs several independent
+    # replications at once and is plotted with its 95% confidence interval.
+    mu = 1000.0 / 60
+    ratios = [u / 10.0 for u in range(1, 11)]
+
+    means = []
+    halfWidths = []
+    for ro in ratios:
+        perReplication, mean, halfWidth = mm1Replications(Params(mu * ro, mu, 1, 1), replications, endTime=10000)
+        means.append(mean)
+        halfWidths.append(halfWidth)
+
+    labels = ['Avg Q length', 'Avg Q delay (sec)', 'Util']
+    plt.figure(2)
+    for m in range(3):
+        plt.subplot(311 + m)
+        plt.errorbar(ratios, [mean[m] for mean in means], yerr=[hw[m] for hw in halfWidths], capsize=3)
+        plt.xlabel('Ratio (ro)')
+        plt.ylabel(labels[m])
+
+    plt.show()
+
+
+def makeReplication(params, replication:int):
+    #the Simulator of one independent replication, drawing from lcgrand substream `replication`
+    sim = Simulator(101, rng=RandomStream(lcgrandsub(replication)))
+    sim.configure(params, States())
+    return sim
+
+
+def experiment2Precise(relWidth=0.05, maxReplications=100, workers=None):
+    # Same sweep as experiment2 with the event simulation, but every ro point
+    # runs replications until its queue length, queue delay and utilization
+    # are all known within relWidth (95% confidence), up to maxReplications:
+    # light loads stop after a few replications and the budget goes to the
+    # loads near 1.
+    mu = 1000.0 / 60
+    ratios = [u / 10.0 for u in range(1, 11)]
+
+    counts = []
+    means = []
+    halfWidths = []
+    for ro in ratios:
+        results, mean, halfWidth = runToPrecision(partial(makeReplication, Params(mu * ro, mu, 1, 1)),
+                                                  lambda result: result, relWidth,
+                                                  maxReplications=maxReplications, workers=workers)
+        print('ro %.1f: %d replications' % (ro, len(results)))
+        counts.append(len(results))
+        means.append(mean)
+        halfWidths.append(halfWidth)
+
+    labels = ['Avg Q length', 'Avg Q delay (sec)', 'Util']
+    plt.figure(4)
+    for m in range(3):
+        plt.subplot(311 + m)
+        plt.errorbar(ratios, [mean[m] for mean in means], yerr=[hw[m] for hw in halfWidths], capsize=3)
+        plt.xlabel('Ratio (ro)')
+        plt.ylabel(labels[m])
+
+    plt.show()
+    return counts, means, halfWidths
+
+
+def experiment2Sweep():
+    # Same sweep as experiment2, evaluated in one pass under common random
+    # numbers: every ro point rescales the same base arrival stream.
+    mu = 1000.0 / 60
+    ratios = [u / 10.0 for u in range(1, 11)]
+    results = mm1Sweep([Params(mu * ro, mu, 1, 1) for ro in ratios], endTime=10000)
+
+    labels = ['Avg Q length', 'Avg Q delay (sec)', 'Util']
+    plt.figure(3)
+    for m in range(3):
+        plt.subplot(311 + m)
+        plt.plot(ratios, [r[m] for r in results])
+        plt.xlabel('Ratio (ro)')
+        plt.ylabel(labels[m])
+
+    plt.show()
+
+
+def experiment2Regenerative(endTime=10000, tasks=8, workers=None):
+    # experiment2 by the regenerative method: for every ro, the cycles of
+    # `tasks` independent runs of endTime seconds, with 95% confidence
+    # intervals next to the exact M/M/1 values. ro = 1 is left out: its
+    # cycles have no finite mean length
+    print('%8s %8s %32s %32s %32s' % ('', 'cycles', 'Avg Q length (exact)', 'Avg Q delay (exact)', 'Util (exact)'))
+    mu = 1000.0 / 60
+    for ro in [u / 10.0 for u in range(1, 10)]:
+        params = Params(mu * ro, mu, 1, 1, endTime)
+        cycles, results, halfWidths = regenerativeResults(params, tasks, workers=workers)
+        exact = analyticResults(params)
+        print('%8s %8d' % ('ro %.1f' % ro, cycles) + ''.join(' %10.6f +- %8.6f (%8.6f)' % (results[m], halfWidths[m], exact[m]) for m in range(3)))
+
+
 def main():
     print("\n\nExperiment 2")
     experiment2()
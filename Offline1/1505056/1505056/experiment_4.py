@@ -6,26 +6,50 @@ ro is defined as the ratio of arrival rate vs service rate.
 For the sake of comparison, while plotting results from simulation, also produce the analytical results.
 """
 
-import heapq
+import itertools
 import random
+from functools import partial
+from collections import deque
 import matplotlib.pyplot as plt
 from lcgrand import MODLUS
 from lcgrand import MULT1
 from lcgrand import MULT2
-from lcgrand import zrng
-from lcgrand import lcgrand
+from lcgrand import RandomStream
+from lcgrand import VariatePool
+from fel import HeapFEL
+from parallel import runSweep
+from routing import QueueIndex
+from routing import JoinShortest
+from routing import PowerOfD
+from routing import RoundRobin
 import math
 IDLE = 0
 BUSY = 1
 
+#integer event type codes, cheaper to compare than strings
+START = 0
+ARRIVAL = 1
+DEPART = 2
+EXIT = 3
+EVENT_NAMES = ['START', 'ARRIVAL', 'DEPART', 'EXIT']
+
+
+def newEventType(name):
+    #add an event type (breakdown, reneging, shift change...) and return its code;
+    #give it a handler with Simulator.registerEvent
+    EVENT_NAMES.append(name)
+    return len(EVENT_NAMES) - 1
+
 
 # Parameters
 class Params:
-    def __init__(self, lambd, mu, k, q):
+    def __init__(self, lambd, mu, k, q, routing=None):
         self.lambd = lambd  # interarrival rate
         self.mu = mu  # service rate
         self.k = k
         self.queueNo = q
+        #with a queue per server, the policy that picks the queue of an arrival (see routing.py)
+        self.routing = routing if routing is not None else JoinShortest()
     # Note lambd and mu are not mean value, they are rates i.e. (1/mean)
 
 # Write more functions if required
@@ -36,7 +60,10 @@ class States:
     def __init__(self):
         # States
         self.queue = [] #this queue stores the arrival times
+        self.queueIndex = None #lengths of the queues, with the leftmost shortest one at hand
         self.status = [] #this holds the status of k servers
+        self.busyServers = 0 #number of BUSY entries in status, counted where a server changes status
+        self.freeServers = 0 #free-server pool as a bitset: bit i is set while server i is IDLE
         self.numInQ = 0.0
         self.timeLastEvent = 0.0
         
@@ -54,7 +81,7 @@ class States:
 
     def update(self, sim, event):
         #if the event is the START event
-        if event.eventType == 'START':
+        if event.eventType == START:
             return
 
         timeSincelastEvent = event.eventTime - self.timeLastEvent
@@ -65,11 +92,7 @@ class States:
         self.areaNumInQ += (self.numInQ * timeSincelastEvent)
 
         #update area under server-busy indicator function
-        busyServers = 0
-        for i in range(sim.params.k):
-            if self.status[i]==BUSY:
-                busyServers += 1
-        self.areaServerStatus += ((busyServers/sim.params.k) * timeSincelastEvent)
+        self.areaServerStatus += ((self.busyServers/sim.params.k) * timeSincelastEvent)
         
 
     def finish(self, sim):
@@ -93,49 +116,64 @@ class States:
 
     def initStatus(self, k:int):
         self.status = []
+        self.busyServers = 0
         i=0
         while i<k:
             self.status.append(IDLE)
             i+=1
+        self.freeServers = (1 << k) - 1
 
     def checkStatus(self, k):
-        i=0
-        while i<k:
-            if self.status[i]==IDLE:
-                return i
-            i+=1
-        return -1
+        #the lowest-numbered IDLE server, or -1 if all are busy: find-first-set on the free-server bitset,
+        #so the cost does not grow with k the way a scan of status does
+        free = self.freeServers
+        if free == 0:
+            return -1
+        return (free & -free).bit_length() - 1
+
+    def seizeServer(self, i:int):
+        #server i starts serving
+        self.status[i] = BUSY
+        self.busyServers += 1
+        self.freeServers ^= 1 << i
+
+    def releaseServer(self, i:int):
+        #server i becomes IDLE
+        self.status[i] = IDLE
+        self.busyServers -= 1
+        self.freeServers |= 1 << i
 
     def initQueue(self, k:int):
         self.queue = []
         i=0
         while i<k:
-            self.queue.append([])
+            self.queue.append(deque()) #O(1) append and pop at both ends
 
             i+=1
+        self.queueIndex = QueueIndex(k)
     
 
 
 
 
 class Event:
-    def __init__(self, sim):
-        self.eventType = None
-        self.sim = sim
-        self.eventTime = None
+    #slots keep events small; the type code lives on the class, not in every event
+    __slots__ = ('eventTime',)
+    eventType = None
+
+    def __init__(self, eventTime, sim):
+        self.eventTime = eventTime
 
     def process(self, sim):
         raise Exception('Unimplemented process method for the event!')
 
     def __repr__(self):
-        return self.eventType
+        return EVENT_NAMES[self.eventType]
 
 
 class StartEvent(Event):
-    def __init__(self, eventTime, sim):
-        self.eventTime = eventTime
-        self.eventType = 'START'
-        self.sim = sim
+    __slots__ = ()
+    eventType = START
 
     def process(self, sim):
         # this is the startEvent. It will enqueue an arrival event
@@ -147,21 +185,16 @@ class StartEvent(Event):
 
 
 class ExitEvent(Event):
-    def __init__(self, eventTime, sim):
-        self.eventTime = eventTime
-        self.eventType = 'EXIT'
-        self.sim = sim
+    __slots__ = ()
+    eventType = EXIT
 
     def process(self, sim):
         None
 
 
 class ArrivalEvent(Event):
-    # Write __init__ function
-    def __init__(self, eventTime ,sim):
-        self.eventTime = eventTime
-        self.sim = sim
-        self.eventType = 'ARRIVAL'
+    __slots__ = ()
+    eventType = ARRIVAL
 
     def process(self, sim):
         #schedule the next arrival
@@ -170,21 +203,21 @@ class ArrivalEvent(Event):
         nextArrival = sim.simclock + temp
         sim.scheduleEvent(ArrivalEvent(nextArrival, sim))
 
-        #check to see if any server is idle
-        freeServer = sim.states.checkStatus(self.sim.params.k)
+        if sim.params.queueNo>1:
+            #every server has its own queue: the routing policy picks one (by default an idle server if any,
+            #else the leftmost shortest queue), and the customer is served at once if that server is idle
+            shortestQueue = sim.params.routing.choose(sim.states.queueIndex, sim.states.freeServers)
+            freeServer = shortestQueue if sim.states.status[shortestQueue]==IDLE else -1
+        else:
+            #check to see if any server is idle
+            freeServer = sim.states.checkStatus(sim.params.k)
+            shortestQueue = 0
         if freeServer == -1:
             sim.states.numInQ += 1
-            #if all the servers are busy, then put the event in the leftmost shortest queue
-            shortestQueue = 0
-            index = 1
-            while index<sim.params.queueNo:
-                if len(sim.states.queue[index])<len(sim.states.queue[shortestQueue]):
-                    shortestQueue = index
-
-                index+=1
             # print(shortestQueue)
             # print(sim.states.queue)
             sim.states.queue[shortestQueue].append(sim.simclock) #this is the arrival time
+            sim.states.queueIndex.change(shortestQueue, 1)
             # print(sim.states.queue)
             # print("here")
         else:
@@ -194,7 +227,7 @@ class ArrivalEvent(Event):
 
             #increment the number of customers served and make server busy
             sim.states.served += 1
-            sim.states.status[freeServer] = BUSY
+            sim.states.seizeServer(freeServer)
 
             #create the departure event for this arrival
             temp= sim.expon(1/sim.params.mu)
@@ -204,23 +237,23 @@ class ArrivalEvent(Event):
 
 
 class DepartureEvent(Event):
-    
+    __slots__ = ('serverNo',)
+    eventType = DEPART
+
     def __init__(self, eventTime, sim, serverNo:int):
         self.eventTime = eventTime
-        self.eventType = 'DEPART'
-        self.sim = sim
         self.serverNo = serverNo
 
 
     def process(self, sim):
         #if there is no one in the particular queue from which the departure event is being issued, make the server idle
         if len(sim.states.queue)>1 and len(sim.states.queue[self.serverNo])==0:
-            sim.states.status[self.serverNo] = IDLE
+            sim.states.releaseServer(self.serverNo)
 
 
         elif len(sim.states.queue)==1 and len(sim.states.queue[0])==0:
                 #sim.states.initStatus(sim.params.k)
-                sim.states.status[self.serverNo] = IDLE
+                sim.states.releaseServer(self.serverNo)
 
 
         else:
@@ -245,9 +278,11 @@ class DepartureEvent(Event):
 
             #move everyone in the queue one step up
             if sim.params.queueNo>1:
-                sim.states.queue[self.serverNo] = sim.states.queue[self.serverNo][1:]
+                sim.states.queue[self.serverNo].popleft()
+                sim.states.queueIndex.change(self.serverNo, -1)
             else:
-                sim.states.queue[0] = sim.states.queue[0][1:]
+                sim.states.queue[0].popleft()
+                sim.states.queueIndex.change(0, -1)
             #when there are k queues,
             #I'll check whether any person from the queue on the left or from the queue on the right can join this queue
             if len(sim.states.queue)>1:
@@ -272,9 +307,10 @@ class DepartureEvent(Event):
                         largerQ = self.serverNo - 1
                 #if there is any queue(either on left or right) which has at least two more people, then one people from the end of the queue will join this queue
                 if maxDiff>=2:
-                    sim.states.queue[self.serverNo].append(sim.states.queue[largerQ][-1])
-                    #adjust the queue from which the person left
-                    sim.states.queue[largerQ] = sim.states.queue[largerQ][0:-1]
+                    #the person leaves the end of that queue
+                    sim.states.queue[self.serverNo].append(sim.states.queue[largerQ].pop())
+                    sim.states.queueIndex.change(largerQ, -1)
+                    sim.states.queueIndex.change(self.serverNo, 1)
 
 
 
@@ -282,17 +318,40 @@ class DepartureEvent(Event):
 
 
 class Simulator:
-    def __init__(self, seed):
-        self.eventQ = [] #this stores the arrival and departure events
+    def __init__(self, seed, rng=None, fel=None, slots=False):
+        #the future event list stores the arrival and departure events; a binary heap unless another list is given
+        self.eventQ = fel if fel is not None else HeapFEL()
+        self.eventSeq = itertools.count() #sequence numbers break ties between events at the same time
+        #dispatch table: event type code -> handler(event, sim)
+        self.handlers = []
+        self.registerEvent(START, StartEvent.process)
+        self.registerEvent(ARRIVAL, ArrivalEvent.process)
+        self.registerEvent(DEPART, DepartureEvent.process)
         self.simclock = 0
         self.seed = seed
+        #every simulator owns its random stream; by default it starts at the seed of lcgrand stream 1
+        self.rng = rng if rng is not None else RandomStream()
+        #expon and erlang read their draws from pre-filled blocks of this stream
+        self.variates = VariatePool(self.rng)
         self.params = None
         self.states = None
+        #slots=True runs without an event list: every event that can be pending gets a fixed slot (see runSlots)
+        self.slots = slots
+        self.slotTimes = None
+        self.slotEvents = None
+        self.departSlot = 0
 
     def initialize(self):
         self.simclock = 0
+        if self.slots:
+            #one slot per event type, then one departure slot per server
+            self.departSlot = len(EVENT_NAMES)
+            self.slotTimes = [math.inf] * (self.departSlot + self.params.k)
+            self.slotEvents = [None] * (self.departSlot + self.params.k)
+            self.scheduleEvent = self.scheduleSlot
         self.states.initStatus(self.params.k)
         self.states.initQueue(self.params.queueNo)
+        self.params.routing.reset(self.params.k)
         # print(self.states.queue)
         self.scheduleEvent(StartEvent(0, self))
 
@@ -303,43 +362,93 @@ class Simulator:
     def now(self):
         return self.simclock
 
+    def registerEvent(self, eventType:int, handler):
+        #handler(event, sim) runs for every event of this type, right after States.update
+        while len(self.handlers) <= eventType:
+            self.handlers.append(None)
+        self.handlers[eventType] = handler
+
     def scheduleEvent(self, event):
-        #heapq is a priority queue
-        heapq.heappush(self.eventQ, (event.eventTime, event))
+        self.eventQ.push((event.eventTime, next(self.eventSeq), event))
+
+    def scheduleSlot(self, event):
+        #scheduleEvent of slot mode: the event takes the slot of its type, a departure the slot of its server.
+        #The model never has two events of a slot pending, so the slot is always free here
+        eventType = event.eventType
+        if eventType == DEPART:
+            slot = self.departSlot + event.serverNo
+        else:
+            slot = eventType
+        self.slotTimes[slot] = event.eventTime
+        self.slotEvents[slot] = event
 
     def run(self):
         random.seed(self.seed)
         self.initialize()
+        if self.slots:
+            self.runSlots()
+        else:
+            self.runEventList()
+        self.states.finish(self)
 
-        while len(self.eventQ) > 0:
-            time, event = heapq.heappop(self.eventQ)
+    def runEventList(self):
+        #the loop only touches locals: pop, update the statistics, dispatch on the type code
+        eventQ = self.eventQ
+        pop = eventQ.pop
+        handlers = self.handlers
+        update = self.states.update
+        while eventQ:
+            time, seq, event = pop()
             
             # print('Queue before event:')
             # print(self.states.queue)
             # print('Server Status before event:')
             # print(self.states.status)
             # print(event.eventTime, 'Event', event)
-            # if event.eventType == 'DEPART':
+            # if event.eventType == DEPART:
             #     print(f"Server No: {event.serverNo}")
 
-            if event.eventType == 'EXIT':
+            eventType = event.eventType
+            if eventType == EXIT:
                 # event.process(self)
                 break
 
             #states are the performance matrices i.e. avg_q_len, avg_delay etc
-            if self.states != None:
-                self.states.update(self, event)
+            update(self, event)
 
             # print(event.eventTime, 'Event', event)
-            self.simclock = event.eventTime
-            event.process(self)
+            self.simclock = time
+            handlers[eventType](event, self)
             # print('Queue after event: ')
             # print(self.states.queue)
             # print('Server status after event:')
             # print(self.states.status)
             # print('\n')
 
-        self.states.finish(self)
+    def runSlots(self):
+        #the next-event-time loop of the C reference (time_next_event[] and timing()): at most k+2 events
+        #are ever pending, so the next one is found by scanning a flat list of slot times (inf when empty)
+        #instead of keeping a heap of (time, seq, event) tuples. Ties go to the lower slot.
+        times = self.slotTimes
+        events = self.slotEvents
+        inf = math.inf
+        handlers = self.handlers
+        update = self.states.update
+        while True:
+            time = min(times)
+            if time == inf:
+                break
+            slot = times.index(time)
+            times[slot] = inf
+            event = events[slot]
+
+            eventType = event.eventType
+            if eventType == EXIT:
+                break
+
+            update(self, event)
+            self.simclock = time
+            handlers[eventType](event, self)
 
     def printResults(self):
         self.states.printResults(self)
@@ -348,10 +457,19 @@ class Simulator:
         return self.states.getResults(self)
 
     def expon(self, mean):
-        return (-mean * math.log(lcgrand(1)))
+        return self.variates.expon(mean)
         # return random.expovariate(1/mean)
 
 
+def runCell(params, seed=101):
+    #one cell of a sweep, run in a worker process by runSweep: every cell starts from the same seed,
+    #as in the serial loop, and the finished States (all of its statistics) go back to the parent
+    sim = Simulator(seed)
+    sim.configure(params, States())
+    sim.run()
+    return sim.states
+
+
 def experiment4():
     # Similar to experiment2 but for different values of k; 1, 2, 3, 4
     # Generate the same plots
@@ -366,12 +484,12 @@ def experiment4():
     ks = [1,2,3,4]
     # ks = [2]
 
-    for k in ks:
+    #the values of k run in parallel worker processes
+    cells = [Params(5.0/60, 8.0/60, k, k) for k in ks]
+    for k, params, states in zip(ks, cells, runSweep(partial(runCell, seed=seed), cells)):
         print(f"iteration {k}")
-        zrng[1] = 1973272912
         sim = Simulator(seed)
-        sim.configure(Params(5.0/60, 8.0/60, k, k), States())
-        sim.run()
+        sim.configure(params, states) #the finished statistics of this k
         sim.printResults()
 
         length, delay, utl = sim.getResults()
@@ -398,6 +516,27 @@ def experiment4():
     plt.show()
 
 
+def experiment4Routing():
+    # Compare the routing policies of routing.py on large systems, one queue
+    # per server and jockeying as in experiment4. The arrival rate is fixed so
+    # every run sees about the same number of customers; mu shrinks with k to
+    # keep ro = 0.95.
+    seed = 101
+    lambd = 20.0
+    ro = 0.95
+    ks = [1000, 10000]
+    policies = [('join shortest', JoinShortest), ('power of 2', lambda: PowerOfD(2)), ('round robin', RoundRobin)]
+
+    #every (k, policy) cell runs in a worker process
+    cells = [(k, name, Params(lambd, lambd / (ro * k), k, k, routing=policy())) for k in ks for name, policy in policies]
+    table = runSweep(partial(runCell, seed=seed), [params for k, name, params in cells])
+
+    print('%6s %14s %14s %14s %8s' % ('k', 'routing', 'Avg Q length', 'Avg Q delay', 'Util'))
+    for (k, name, params), states in zip(cells, table):
+        length, delay, utl = states.getResults(None)
+        print('%6d %14s %14.6f %14.6f %8.4f' % (k, name, length, delay, utl))
+
+
 def main():
     print("\n\nExperiment 4")
     experiment4()
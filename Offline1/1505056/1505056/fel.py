@@ -0,0 +1,155 @@
+"""
+Future event lists for the Simulator.
+
+Every list stores (eventTime, seq, event) entries and offers push(entry),
+pop() -> entry with the smallest (eventTime, seq), and len(). A Simulator
+takes one through its fel argument, so the event list can be chosen per
+simulation:
+
+    HeapFEL        binary heap on heapq, O(log n) per operation
+    CalendarQueue  Brown's calendar queue, O(1) average per operation when
+                   event times are spread evenly enough to fill its buckets
+
+Both pop entries in exactly the same order, so switching lists never changes
+the results of a run. Run this file to benchmark them with the classic hold
+model (pop one event, push one event further in the future) for a range of
+list sizes.
+"""
+
+import heapq
+import random
+import time
+from bisect import insort
+from functools import partial
+
+
+class HeapFEL:
+    __slots__ = ('items', 'push', 'pop')
+
+    def __init__(self):
+        self.items = []
+        # bound C functions, so push and pop cost no Python frame
+        self.push = partial(heapq.heappush, self.items)
+        self.pop = partial(heapq.heappop, self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+class CalendarQueue:
+    """
+    Calendar queue (R. Brown, CACM 1988). Entries are hashed into nBuckets
+    sorted "days" of the given width by their time; one pass over all days is
+    a "year". pop scans forward from the current day and returns the first
+    entry that falls in it, falling back to a direct search when a whole year
+    is empty. The number of days doubles or halves as the list grows or
+    shrinks, and the day width is re-estimated from the gaps between the
+    earliest entries, so each day holds a few entries on average.
+    """
+    __slots__ = ('buckets', 'nBuckets', 'width', 'size', 'day', 'lastTime', 'growAt', 'shrinkAt')
+
+    def __init__(self, nBuckets:int = 2, width=1.0):
+        self.size = 0
+        self.lastTime = 0.0
+        self._build(nBuckets, width, [])
+
+    def _build(self, nBuckets, width, entries):
+        self.nBuckets = nBuckets
+        self.width = width
+        self.buckets = [[] for i in range(nBuckets)]
+        self.growAt = 2 * nBuckets
+        self.shrinkAt = nBuckets // 2 - 2
+        # day is the absolute day number being scanned, i.e. floor(t / width)
+        self.day = int(self.lastTime / width)
+        buckets = self.buckets
+        for entry in entries:
+            buckets[int(entry[0] / width) % nBuckets].append(entry)
+        for bucket in buckets:
+            bucket.sort()
+
+    def _resize(self, nBuckets):
+        entries = [entry for bucket in self.buckets for entry in bucket]
+        entries.sort()
+        self._build(nBuckets, self._estimateWidth(entries), entries)
+
+    def _estimateWidth(self, entries):
+        # three times the average gap between the earliest entries, ignoring
+        # gaps more than twice the first average (Brown's heuristic)
+        sample = [entry[0] for entry in entries[:25]]
+        gaps = [b - a for a, b in zip(sample, sample[1:])]
+        if not gaps:
+            return self.width
+        average = sum(gaps) / len(gaps)
+        kept = [g for g in gaps if g <= 2.0 * average]
+        if kept:
+            average = sum(kept) / len(kept)
+        return 3.0 * average if average > 0.0 else self.width
+
+    def push(self, entry):
+        insort(self.buckets[int(entry[0] / self.width) % self.nBuckets], entry)
+        self.size += 1
+        if self.size > self.growAt:
+            self._resize(2 * self.nBuckets)
+
+    def pop(self):
+        if self.size == 0:
+            raise IndexError('pop from an empty calendar queue')
+        buckets = self.buckets
+        nBuckets = self.nBuckets
+        width = self.width
+        day = self.day
+        for i in range(nBuckets):
+            bucket = buckets[day % nBuckets]
+            if bucket and int(bucket[0][0] / width) <= day:
+                return self._take(bucket, day)
+            day += 1
+
+        # a whole year without an event: jump straight to the earliest one
+        bucket = min((b for b in buckets if b), key=lambda b: b[0])
+        return self._take(bucket, int(bucket[0][0] / width))
+
+    def _take(self, bucket, day):
+        entry = bucket.pop(0)
+        self.day = day
+        self.lastTime = entry[0]
+        self.size -= 1
+        if self.size < self.shrinkAt:
+            self._resize(max(2, self.nBuckets // 2))
+        return entry
+
+    def __len__(self):
+        return self.size
+
+
+def holdBenchmark(fel, size:int, holds:int, seed=1):
+    # Hold model: fill the list with size entries, then repeatedly pop the
+    # earliest one and push a new one an exponential time later.
+    # Returns the time per hold operation in seconds.
+    rng = random.Random(seed)
+    seq = 0
+    for i in range(size):
+        fel.push((rng.expovariate(1.0), seq, None))
+        seq += 1
+    push = fel.push
+    pop = fel.pop
+    expovariate = rng.expovariate
+    start = time.perf_counter()
+    for i in range(holds):
+        t, s, e = pop()
+        push((t + expovariate(1.0), seq, None))
+        seq += 1
+    return (time.perf_counter() - start) / holds
+
+
+def main():
+    print('hold-model cost per pop+push (microseconds)')
+    print('%10s %10s %10s' % ('size', 'heap', 'calendar'))
+    for size in [10, 100, 1000, 10000, 100000, 1000000]:
+        holds = max(100000, 2 * size)
+        heap = holdBenchmark(HeapFEL(), size, holds)
+        calendar = holdBenchmark(CalendarQueue(), size, holds)
+        print('%10d %10.3f %10.3f' % (size, heap * 1e6, calendar * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Routing of arrivals among parallel queues, each in front of its own server.
+
+QueueIndex keeps the lengths of k queues and answers "leftmost shortest
+queue" without scanning them. The routing policies pick the queue an arrival
+joins from that index and the free-server bitset of the model (bit i set
+while server i is idle):
+
+    JoinShortest  an idle server if there is one (the lowest numbered), else
+                  the leftmost shortest queue; the original rule of the models
+    PowerOfD      the least loaded of d servers drawn at random
+    RoundRobin    servers in turn, whatever their load
+
+A policy object is reset by the Simulator at the start of every run, so one
+Params (and its policy) can be run several times with the same results.
+"""
+
+import heapq
+
+from lcgrand import RandomStream
+from lcgrand import SUBSTREAM_COUNT
+from lcgrand import lcgrandsub
+
+
+ROUTING_SUBSTREAM = SUBSTREAM_COUNT - 1  # the last lcgrand substream, far from the replications counted up from 0
+
+
+class QueueIndex:
+    """
+    Lengths of k queues with the leftmost shortest one at hand in O(log k).
+    Every change pushes the new (length, queue) pair on a heap; pairs that no
+    longer match the length of their queue are dropped lazily when they reach
+    the top, and the heap is rebuilt from the lengths once it holds too many
+    of them.
+    """
+    __slots__ = ('lengths', 'heap', 'limit')
+
+    def __init__(self, k:int):
+        self.lengths = [0] * k
+        self.heap = [(0, i) for i in range(k)]  # sorted, so already a heap
+        self.limit = 4 * k + 64
+
+    def change(self, i:int, change):
+        n = self.lengths[i] + change
+        self.lengths[i] = n
+        heapq.heappush(self.heap, (n, i))
+        if len(self.heap) > self.limit:
+            self.heap = [(n, i) for i, n in enumerate(self.lengths)]
+            heapq.heapify(self.heap)
+
+    def shortest(self):
+        # the leftmost queue of the smallest length
+        heap = self.heap
+        lengths = self.lengths
+        while True:
+            n, i = heap[0]
+            if lengths[i] == n:
+                return i
+            heapq.heappop(heap)
+
+    def __len__(self):
+        return len(self.lengths)
+
+
+def lowestFree(free):
+    # number of the lowest idle server in a free-server bitset (free != 0)
+    return (free & -free).bit_length() - 1
+
+
+class JoinShortest:
+    __slots__ = ()
+
+    def reset(self, k:int):
+        return
+
+    def choose(self, queues, free):
+        if free:
+            return lowestFree(free)
+        return queues.shortest()
+
+
+class PowerOfD:
+    """
+    Draws d servers uniformly (with replacement) and picks the one with the
+    fewest customers, counting the one in service; ties go to the lowest
+    number. The draws come from a stream of their own, by default lcgrand
+    substream ROUTING_SUBSTREAM, so the routing never shifts the arrival and
+    service draws of the model, nor reuses them: the default lcgrand streams
+    are only 100,000 draws apart, fewer than a long run takes from stream 1.
+    """
+    __slots__ = ('d', 'seed', 'rng', 'k')
+
+    def __init__(self, d:int = 2, seed=None):
+        if d < 1:
+            raise ValueError('PowerOfD needs d >= 1')
+        self.d = d
+        self.seed = seed if seed is not None else lcgrandsub(ROUTING_SUBSTREAM)
+        self.rng = RandomStream(self.seed)
+        self.k = 0
+
+    def reset(self, k:int):
+        self.rng.setSeed(self.seed)
+        self.k = k
+
+    def choose(self, queues, free):
+        lengths = queues.lengths
+        uniform = self.rng.uniform
+        best = -1
+        bestLoad = 0
+        for j in range(self.d):
+            i = int(uniform() * self.k)
+            load = lengths[i] + (0 if free >> i & 1 else 1)
+            if best == -1 or load < bestLoad or (load == bestLoad and i < best):
+                best = i
+                bestLoad = load
+        return best
+
+
+class RoundRobin:
+    __slots__ = ('k', 'next')
+
+    def __init__(self):
+        self.k = 0
+        self.next = 0
+
+    def reset(self, k:int):
+        self.k = k
+        self.next = 0
+
+    def choose(self, queues, free):
+        i = self.next
+        self.next = i + 1 if i + 1 < self.k else 0
+        return i
@@ -0,0 +1,51 @@
+import numpy as np
+
+from analysis import batchMeans
+from analysis import correlatedBatches
+
+
+def ar1(phi, n, mean=5.0, seed=7):
+    # x[i] = mean + phi * (x[i-1] - mean) + e[i], started in its stationary law
+    e = np.random.default_rng(seed).standard_normal(n)
+    x = np.empty(n)
+    x[0] = e[0] / np.sqrt(1.0 - phi * phi)
+    for i in range(1, n):
+        x[i] = phi * x[i - 1] + e[i]
+    return mean + x
+
+
+def sums(x):
+    # batch increments of a series: its total and its count
+    return np.column_stack((x, np.ones(len(x))))
+
+
+def average(increments):
+    return increments[:, :1] / increments[:, 1:]
+
+
+def testCorrelatedBatchesAllowsForSamplingNoise():
+    assert correlatedBatches([0.3], 100).all()
+    assert not correlatedBatches([0.3], 25).any()
+    assert correlatedBatches([0.15], 10000).all()
+
+
+def testMergesAR1UntilBatchesAreIndependent():
+    # lag-1 of 0.9 between observations: batches of a few dozen are needed
+    batches, mean, halfWidth, lag1, correlated = batchMeans(sums(ar1(0.9, 1 << 14)), average)
+    assert 20 <= batches < (1 << 14) // 16
+    assert not correlated.any()
+    assert abs(mean[0] - 5.0) <= halfWidth[0]
+
+
+def testKeepsIndependentObservationsUnmerged():
+    batches, mean, halfWidth, lag1, correlated = batchMeans(sums(ar1(0.0, 4096)), average)
+    assert batches == 4096
+    assert not correlated.any()
+    assert abs(mean[0] - 5.0) <= halfWidth[0]
+
+
+def testFlagsARunTooShortForItsCorrelation():
+    # lag-1 of 0.999: independent batches would need many thousands of observations each
+    batches, mean, halfWidth, lag1, correlated = batchMeans(sums(ar1(0.999, 4096)), average)
+    assert 20 <= batches < 40
+    assert correlated.all()
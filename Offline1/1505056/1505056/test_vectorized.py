@@ -0,0 +1,100 @@
+import numpy as np
+
+import experiment_2
+import experiment_3
+from lcgrand import RandomStream
+from lcgrand import _lcgbatch
+from lcgrand import lcgrandsub
+from experiment_2 import Params
+from analytic import analyticResults
+from vectorized import defaultStreams
+from vectorized import drawInterarrivals
+from vectorized import exponArray
+from vectorized import kieferWolfowitzDelays
+from vectorized import lindleyDelays
+from vectorized import mm1Lindley
+from vectorized import mm1Metrics
+from vectorized import mm1Replications
+from vectorized import mm1Sweep
+from vectorized import mmkMetrics
+
+
+def draws(params, endTime, substream=0):
+    # interarrival and service arrays for a run of params, with a service time for every arrival
+    arrivalRng = RandomStream(lcgrandsub(2 * substream))
+    serviceRng = RandomStream(lcgrandsub(2 * substream + 1))
+    interarrival = drawInterarrivals(arrivalRng, 1 / params.lambd, endTime)
+    return interarrival, exponArray(serviceRng, 1 / params.mu, len(interarrival))
+
+
+def replay(model, params, interarrival, service):
+    # Run the event Simulator of a model module on the given arrays instead
+    # of its random stream: arrival i comes interarrival[0] + ... + interarrival[i]
+    # after the start, and the i-th service to begin takes service[i], which
+    # under FCFS is the service of customer i. Returns the finished Simulator
+    # and the delay in queue of every customer it started serving.
+    arrivalTime = np.cumsum(interarrival)
+    nextDraw = {1 / params.lambd: iter(interarrival.tolist()), 1 / params.mu: iter(service.tolist())}
+    delays = []
+    sim = model.Simulator(101)
+    sim.configure(params, model.States())
+
+    def expon(mean):
+        if mean == 1 / params.mu:
+            delays.append(sim.simclock - arrivalTime[len(delays)])
+        return next(nextDraw[mean])
+
+    sim.expon = expon
+    sim.run()
+    return sim, np.array(delays)
+
+
+def testLongDefaultRunKeepsArrivalsAndServicesApart():
+    # ro = 1 over 10000 seconds is about 170,000 arrivals, more than the
+    # 100,000 numbers between lcgrand streams 1 and 2
+    params = Params(1000.0/60, 1000.0/60, 1, 1)
+    endTime = 10000
+    arrivalRng, serviceRng = defaultStreams(1 / params.lambd, endTime)
+    arrivalSeed, serviceSeed = arrivalRng.getSeed(), serviceRng.getSeed()
+    n = len(drawInterarrivals(arrivalRng, 1 / params.lambd, endTime))
+    assert n > 100000
+
+    # no lcgrand state is used for both an interarrival and a service time
+    assert len(np.intersect1d(_lcgbatch(arrivalSeed, n), _lcgbatch(serviceSeed, n))) == 0
+
+    # and those are the streams the engines use by default
+    arrivalRng, serviceRng = defaultStreams(1 / params.lambd, endTime)
+    assert mm1Lindley(params, endTime) == mm1Lindley(params, endTime, arrivalRng, serviceRng)
+    arrivalRng, serviceRng = defaultStreams(1 / params.lambd, endTime)
+    assert mm1Sweep([params], endTime) == mm1Sweep([params], endTime, arrivalRng, serviceRng)
+
+
+def testLindleyMatchesTheEventSimulator():
+    # the experiment_2 Simulator and the Lindley engine on the same draws
+    params = Params(0.9, 1.0, 1, 1, endTime=5000)
+    interarrival, service = draws(params, params.endTime)
+    sim, delays = replay(experiment_2, params, interarrival, service)
+    assert len(delays) > 4000
+    np.testing.assert_allclose(lindleyDelays(interarrival, service)[:len(delays)], delays, rtol=1e-9, atol=1e-9)
+
+    # the Simulator closes its statistics at its last event before endTime, the engine at endTime
+    np.testing.assert_allclose(mm1Metrics(interarrival, service, params.endTime), sim.getResults(), rtol=1e-4)
+
+
+def testLindleyReplicationsMatchTheAnalyticMM1():
+    # (Lq, Wq, util) over independent replications, against the closed form, at the 99% level
+    params = Params(0.5, 1.0, 1, 1)
+    results, mean, halfWidth = mm1Replications(params, 50, endTime=20000, level=0.99)
+    exact = analyticResults(params)
+    assert np.all(np.abs(mean - exact) <= halfWidth)
+
+
+def testKieferWolfowitzMatchesTheEventSimulator():
+    # the experiment_3 Simulator (one shared line, k servers) and the workload recursion on the same draws
+    for k in [1, 4, 200]:
+        params = experiment_3.Params(0.97 * k, 1.0, k, 1, endTime=20000.0 / k)
+        interarrival, service = draws(params, params.endTime)
+        sim, delays = replay(experiment_3, params, interarrival, service)
+        assert np.count_nonzero(delays) > 100
+        np.testing.assert_allclose(kieferWolfowitzDelays(interarrival, service, k)[:len(delays)], delays, rtol=1e-9, atol=1e-9)
+        np.testing.assert_allclose(mmkMetrics(interarrival, service, k, params.endTime), sim.getResults(), rtol=1e-4)
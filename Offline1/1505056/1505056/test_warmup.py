@@ -0,0 +1,62 @@
+import importlib.util
+import os
+
+import numpy as np
+import pytest
+
+from warmup import TruncationError
+from warmup import mserTruncation
+from experiment_3 import States
+
+#the job shop of Offline 2, loaded by path since its file name is not a module name
+JOB_SHOP = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'Offline2', '1505056')
+
+
+@pytest.fixture
+def jobShop(monkeypatch):
+    monkeypatch.syspath_prepend(JOB_SHOP)
+    monkeypatch.chdir(JOB_SHOP)
+    spec = importlib.util.spec_from_file_location('jobShop', os.path.join(JOB_SHOP, '1505056-1.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def testCutsTheTransient():
+    y = np.concatenate((np.linspace(0.0, 1.0, 20), 1.0 + 0.1 * np.sin(np.arange(180))))
+    assert 10 <= mserTruncation(y) <= 25
+
+
+def testRaisesAtTheEndOfTheSearchRange():
+    # a series that is still climbing has its minimum at the last allowed cut
+    with pytest.raises(TruncationError):
+        mserTruncation(np.arange(173, dtype=np.float64))
+
+
+def testRaisesOnAnEqualTail():
+    # nobody waits after the first few batches: every cut into the zeros scores 0
+    with pytest.raises(TruncationError):
+        mserTruncation([3.0, 1.0, 0.5] + [0.0] * 40)
+
+
+def testRaisesOnTooFewObservations():
+    with pytest.raises(TruncationError):
+        mserTruncation([1.0, 2.0, 3.0])
+
+
+def testFindWarmupEndKeepsTheFixedWarmup():
+    states = States(recordWarmup=True)
+    states.checkpoints = [(10.0 * i, float(i * i), float(i * i)) for i in range(174)]
+    with pytest.warns(UserWarning, match='too short'):
+        states.findWarmupEnd(250.0)
+    assert states.warmupEnd == 250.0
+
+
+def testDetectWarmupWithEveryMetricEmpty(jobShop, monkeypatch):
+    # no metric is left to run MSER on: warn and drop nothing, as when MSER cannot tell
+    params = jobShop.readParams()
+    params.endTime = 8 * 30
+    params.batchLength = 8
+    monkeypatch.setattr(jobShop, 'batchMetrics', lambda params, increments: np.full((len(increments), 15), np.nan))
+    with pytest.warns(UserWarning, match='every metric has an empty batch'):
+        assert jobShop.detectWarmup(params) == 0.0
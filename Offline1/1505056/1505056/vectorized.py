@@ -0,0 +1,361 @@
+"""
+Array-based engines for the Offline1 queueing experiments.
+
+Instead of pushing every arrival and departure through the event list, these
+engines take whole NumPy arrays of interarrival and service times and compute
+the delays of all customers at once. They report the same statistics as
+States.getResults, i.e. (avgQlength, avgQdelay, util), measured over a run
+that ends at time endTime just like the ExitEvent of the Simulator.
+
+Arrivals and services are drawn from two separate lcgrand streams (by
+default substreams 0 and 1, sized to the run, see defaultStreams), so results
+agree with the event-driven Simulator in distribution but not draw for draw.
+Since they do not match it draw for draw anyway, exponentials are taken with
+np.log over whole blocks rather than the bit-exact (and much slower)
+per-element math.log of RandomStream.exponBatch.
+
+For single-queue M/M/k models there is also an engine that skips customers
+altogether: the number in system is a birth-death chain, simulated for many
+independent paths at once by uniformization (see uniformizedPaths).
+"""
+
+import heapq
+import math
+
+import numpy as np
+
+from lcgrand import RandomStream
+from lcgrand import ZRNG_DEFAULT
+from lcgrand import SUBSTREAM_LENGTH
+from lcgrand import lcgrandsub
+from analysis import confidenceInterval
+
+
+def lindleyDelays(interarrival, service):
+    # Delay in queue of every customer of a single-server FCFS queue.
+    # Lindley: D[0] = 0, D[i] = max(0, D[i-1] + S[i-1] - A[i]).
+    # Unrolled, D[i] = C[i] - min(C[0..i]) where C is the random walk of the
+    # increments S[i-1] - A[i], so the whole recursion is a cumsum and a
+    # running minimum. 2-D inputs hold one independent run per row.
+    interarrival = np.asarray(interarrival, dtype=np.float64)
+    service = np.asarray(service, dtype=np.float64)
+    walk = np.zeros(interarrival.shape)
+    if interarrival.shape[-1] == 0:
+        return walk
+    np.cumsum(service[..., :-1] - interarrival[..., 1:], axis=-1, out=walk[..., 1:])
+    return walk - np.minimum.accumulate(walk, axis=-1)
+
+
+def kieferWolfowitzDelays(interarrival, service, k:int):
+    # Delay in queue of every customer of a k-server FCFS queue.
+    # The Kiefer-Wolfowitz workload vector W (sorted remaining work of each
+    # server) obeys W' = sort((W + S[i]e_0 - A[i+1])^+), and the delay of
+    # customer i is W[0]. Written in absolute time the vector is just the
+    # times at which the servers become free, W[j] = max(free[j] - t, 0), and
+    # the sort only ever needs the smallest entry, so a binary heap gives
+    # the same recursion in O(log k) per customer.
+    if k < 1:
+        raise ValueError('k must be at least 1')
+    arrival = np.cumsum(np.asarray(interarrival, dtype=np.float64))
+    delay = np.empty(len(arrival))
+    free = [0.0] * k  # all servers idle at time 0; a list of equal keys is a heap
+    replace = heapq.heapreplace
+    i = 0
+    for t, s in zip(arrival.tolist(), np.asarray(service, dtype=np.float64).tolist()):
+        f = free[0]
+        if f > t:
+            delay[i] = f - t
+            replace(free, f + s)
+        else:
+            delay[i] = 0.0
+            replace(free, t + s)
+        i += 1
+    return delay
+
+
+def exponArray(rng, mean, n:int):
+    # n exponential draws with the given mean from a RandomStream
+    return -mean * np.log(rng.uniformBatch(n))
+
+
+def drawInterarrivals(rng, mean, endTime):
+    # Draw exponential interarrival times until the arrivals pass endTime.
+    # The first guess covers endTime with high probability; the rare
+    # shortfall is topped up from the same stream.
+    expected = endTime / mean
+    n = int(expected + 6.0 * math.sqrt(expected) + 16)
+    gaps = exponArray(rng, mean, n)
+    total = gaps.sum()
+    while total < endTime:
+        more = exponArray(rng, mean, max(16, n // 8))
+        gaps = np.concatenate((gaps, more))
+        total += more.sum()
+    return gaps
+
+
+def substreamLength(n:int):
+    # length of the substreams of a run that draws about n numbers from each:
+    # a power-of-two multiple of SUBSTREAM_LENGTH with room for twice that,
+    # so the rare top-up of drawInterarrivals stays inside the substream
+    length = SUBSTREAM_LENGTH
+    while length < 2 * n:
+        length *= 2
+    return length
+
+
+def defaultStreams(meanArrival, endTime):
+    # (arrivalRng, serviceRng) of a run that ends at endTime: substreams 0
+    # and 1, long enough that the arrivals never run into the services.
+    # Default lcgrand streams 1 and 2 are only STREAM_SPACING draws apart,
+    # so a long run would reuse its arrival numbers as service numbers.
+    expected = endTime / meanArrival
+    length = substreamLength(int(expected + 6.0 * math.sqrt(expected) + 16))
+    return RandomStream(lcgrandsub(0, length)), RandomStream(lcgrandsub(1, length))
+
+
+def rowMetrics(arrival, delay, service, endTime, k=1, queueNo=1):
+    # Turn arrival times, queue delays and service times into the
+    # (avgQlength, avgQdelay, util) statistics of States.getResults, counting
+    # only what happens before endTime. Every row of the 2-D inputs is a
+    # separate run; the result has one row of three statistics per run.
+    start = arrival + delay
+    arrived = arrival < endTime
+    started = start < endTime
+    served = np.count_nonzero(started, axis=-1)
+
+    # area under Q(t): each customer waits in queue from arrival to start
+    areaNumInQ = np.where(arrived, np.minimum(start, endTime) - arrival, 0.0).sum(axis=-1)
+    # area under the busy-server count, cut at endTime
+    busy = np.where(started, np.minimum(start + service, endTime) - start, 0.0).sum(axis=-1)
+    totalDelay = np.where(started, delay, 0.0).sum(axis=-1)
+
+    avgQdelay = totalDelay / np.maximum(served, 1)
+    avgQlength = (areaNumInQ / endTime) / queueNo
+    util = busy / (k * endTime)
+    return np.stack((avgQlength, avgQdelay, util), axis=-1)
+
+
+def queueMetrics(arrival, delay, service, endTime, k=1, queueNo=1):
+    # rowMetrics for a single run, as the plain tuple getResults returns
+    row = rowMetrics(arrival[np.newaxis, :], delay[np.newaxis, :], service[np.newaxis, :], endTime, k, queueNo)[0]
+    return (float(row[0]), float(row[1]), float(row[2]))
+
+
+def mm1Metrics(interarrival, service, endTime):
+    # Statistics of one M/M/1 (or any G/G/1 FCFS) run from its input arrays.
+    delay = lindleyDelays(interarrival, service)
+    return queueMetrics(np.cumsum(interarrival), delay, np.asarray(service, dtype=np.float64), endTime)
+
+
+def mmkMetrics(interarrival, service, k:int, endTime):
+    # Statistics of one single-queue M/M/k (or G/G/k FCFS) run.
+    delay = kieferWolfowitzDelays(interarrival, service, k)
+    return queueMetrics(np.cumsum(interarrival), delay, np.asarray(service, dtype=np.float64), endTime, k=k)
+
+
+def mm1Lindley(params, endTime=10000, arrivalRng=None, serviceRng=None):
+    # Vectorized replacement for a Simulator run of a single-server,
+    # single-queue model; returns the same tuple as Simulator.getResults.
+    if params.k != 1 or params.queueNo != 1:
+        raise ValueError('mm1Lindley needs k = 1 and a single queue')
+    if arrivalRng is None or serviceRng is None:
+        streams = defaultStreams(1 / params.lambd, endTime)
+        arrivalRng = arrivalRng if arrivalRng is not None else streams[0]
+        serviceRng = serviceRng if serviceRng is not None else streams[1]
+
+    interarrival = drawInterarrivals(arrivalRng, 1 / params.lambd, endTime)
+    service = exponArray(serviceRng, 1 / params.mu, len(interarrival))
+    return mm1Metrics(interarrival, service, endTime)
+
+
+def mmkWorkload(params, endTime=10000, arrivalRng=None, serviceRng=None):
+    # Vectorized replacement for a Simulator run of a k-server model with one
+    # shared queue (experiment_3); returns the same tuple as getResults.
+    if params.queueNo != 1:
+        raise ValueError('mmkWorkload needs a single shared queue')
+    if arrivalRng is None or serviceRng is None:
+        streams = defaultStreams(1 / params.lambd, endTime)
+        arrivalRng = arrivalRng if arrivalRng is not None else streams[0]
+        serviceRng = serviceRng if serviceRng is not None else streams[1]
+
+    interarrival = drawInterarrivals(arrivalRng, 1 / params.lambd, endTime)
+    service = exponArray(serviceRng, 1 / params.mu, len(interarrival))
+    if params.k == 1:
+        return mm1Metrics(interarrival, service, endTime)
+    return mmkMetrics(interarrival, service, params.k, endTime)
+
+
+
+def mm1Replications(params, replications:int, endTime=10000, level=0.95, firstSubstream=0, maxBlock=1 << 22):
+    # Simulate independent M/M/1 replications together as the rows of 2-D
+    # arrays. Replication r draws its arrivals from substream
+    # 2*(firstSubstream+r) and its services from the substream after it, so
+    # every row is independent and reproducible on its own.
+    # Rows are processed in chunks of at most maxBlock array cells to bound
+    # memory. Returns (perReplication, mean, halfWidth): a replications x 3
+    # array of (avgQlength, avgQdelay, util) and their pooled means and
+    # t confidence-interval half-widths.
+    if params.k != 1 or params.queueNo != 1:
+        raise ValueError('mm1Replications needs k = 1 and a single queue')
+    meanArrival = 1 / params.lambd
+    meanService = 1 / params.mu
+    expected = endTime / meanArrival
+    n = int(expected + 6.0 * math.sqrt(expected) + 16)
+    length = substreamLength(n)
+
+    results = np.empty((replications, 3))
+    rowsPerBlock = max(1, maxBlock // n)
+    for first in range(0, replications, rowsPerBlock):
+        rows = range(first, min(first + rowsPerBlock, replications))
+        arrivalRngs = [RandomStream(lcgrandsub(2 * (firstSubstream + r), length)) for r in rows]
+        serviceRngs = [RandomStream(lcgrandsub(2 * (firstSubstream + r) + 1, length)) for r in rows]
+        interarrival = np.stack([exponArray(rng, meanArrival, n) for rng in arrivalRngs])
+        # the rare row whose arrivals stop short of endTime gets more columns
+        while interarrival.sum(axis=1).min() < endTime:
+            more = max(16, n // 8)
+            interarrival = np.hstack((interarrival, np.stack([exponArray(rng, meanArrival, more) for rng in arrivalRngs])))
+        service = np.stack([exponArray(rng, meanService, interarrival.shape[1]) for rng in serviceRngs])
+
+        delay = lindleyDelays(interarrival, service)
+        results[first:first + len(rows)] = rowMetrics(np.cumsum(interarrival, axis=1), delay, service, endTime)
+
+    mean, halfWidth = confidenceInterval(results, level)
+    return results, mean, halfWidth
+
+
+def mm1Sweep(paramsList, endTime=10000, arrivalRng=None, serviceRng=None):
+    # Evaluate a whole sweep of M/M/1 points that share mu and differ only in
+    # lambd (the ro sweep of experiment_2) under common random numbers.
+    # One base array of unit exponentials is drawn for the arrivals and one
+    # for the services; point j scales the arrivals by 1/lambd_j, so every
+    # point sees the same underlying randomness and the curves are directly
+    # comparable. Returns one (avgQlength, avgQdelay, util) tuple per point.
+    if len(paramsList) == 0:
+        return []
+    mu = paramsList[0].mu
+    for params in paramsList:
+        if params.k != 1 or params.queueNo != 1 or params.mu != mu:
+            raise ValueError('mm1Sweep needs k = 1, a single queue and the same mu at every point')
+    # the busiest point needs the most draws, so the default streams are sized for it
+    maxLambd = max(params.lambd for params in paramsList)
+    if arrivalRng is None or serviceRng is None:
+        streams = defaultStreams(1 / maxLambd, endTime)
+        arrivalRng = arrivalRng if arrivalRng is not None else streams[0]
+        serviceRng = serviceRng if serviceRng is not None else streams[1]
+
+    # the busiest point needs the most arrivals; the others use a prefix
+    unitArrival = drawInterarrivals(arrivalRng, 1 / maxLambd, endTime) * maxLambd
+    unitArrivalTime = np.cumsum(unitArrival)
+    service = exponArray(serviceRng, 1 / mu, len(unitArrival))
+
+    results = []
+    for params in paramsList:
+        n = int(np.searchsorted(unitArrivalTime, endTime * params.lambd)) + 1
+        n = min(n, len(unitArrival))
+        interarrival = unitArrival[:n] / params.lambd
+        results.append(mm1Metrics(interarrival, service[:n], endTime))
+    return results
+
+
+def uniformizationRate(params):
+    # rate of the uniformized chain of a single-queue M/M/k: every state
+    # jumps at this rate, some jumps being self-loops
+    return params.lambd + params.k * params.mu
+
+
+def uniformizedPaths(params, steps:int, paths:int, rng=None, maxBlock=1 << 20):
+    # The number in system of `paths` independent copies of a single-queue
+    # M/M/k, all starting empty, advanced by uniformization: every step draws
+    # one uniform per path and makes an arrival (probability lambd / rate), a
+    # departure (min(n, k) * mu / rate) or a self-loop. Steps come at the
+    # times of a Poisson process of uniformizationRate(params), the same for
+    # every state, so a state's share of the steps is its share of the time.
+    # Yields the states after every step as blocks of at most maxBlock
+    # cells, one row per step and one column per path.
+    if params.queueNo != 1:
+        raise ValueError('uniformizedPaths needs a single shared queue')
+    if rng is None:
+        rng = RandomStream(ZRNG_DEFAULT[1])
+    arrival = params.lambd / uniformizationRate(params)
+    departure = params.mu / uniformizationRate(params)
+    n = np.zeros(paths)  # float, so the comparison below needs no conversion
+    block = max(1, maxBlock // paths)
+    for first in range(0, steps, block):
+        rows = min(block, steps - first)
+        u = rng.uniformBatch(rows * paths).reshape(rows, paths)
+        # an arrival if u < arrival; otherwise a departure if the uniform,
+        # measured in units of mu / rate past arrival, is below min(n, k):
+        # v < n with v set to inf where it is not below k, so only the
+        # comparison with n is left for the step loop
+        arrives = u < arrival
+        v = (u - arrival) / departure
+        v[arrives | (v >= params.k)] = np.inf
+        states = np.empty((rows, paths))
+        for j in range(rows):
+            leaves = v[j] < n
+            n += arrives[j]
+            n -= leaves
+            states[j] = n
+        yield states.astype(np.int64)
+
+
+def ctmcSteadyState(params, steps:int, paths:int, warmupSteps:int = 0, level=0.95, rng=None):
+    # Steady state of a single-queue M/M/k from the embedded uniformized
+    # chain of independent paths: each path averages its states over the
+    # steps after warmupSteps, giving (avgQlength, avgQdelay, util) as
+    # getResults does, the delay by Little's law Lq / lambd.
+    # Returns (perPath, mean, halfWidth, distribution): a paths x 3 array,
+    # its means and t half-widths across paths, and the fraction of the
+    # steps spent in each number in system, pooled over the paths.
+    k = params.k
+    queued = np.zeros(paths)
+    busy = np.zeros(paths)
+    counts = np.zeros(0, dtype=np.int64)
+    skip = warmupSteps
+    for states in uniformizedPaths(params, warmupSteps + steps, paths, rng):
+        if skip >= len(states):
+            skip -= len(states)
+            continue
+        states = states[skip:]
+        skip = 0
+        busyNow = np.minimum(states, k)
+        busy += busyNow.sum(axis=0)
+        queued += (states - busyNow).sum(axis=0)
+        seen = np.bincount(states.ravel())
+        if len(seen) > len(counts):
+            counts = np.concatenate((counts, np.zeros(len(seen) - len(counts), dtype=np.int64)))
+        counts[:len(seen)] += seen
+
+    avgQlength = queued / steps
+    perPath = np.stack((avgQlength, avgQlength / params.lambd, busy / (k * steps)), axis=-1)
+    mean, halfWidth = confidenceInterval(perPath, level)
+    return perPath, mean, halfWidth, counts / counts.sum()
+
+
+def ctmcTransient(params, times, paths:int, rng=None):
+    # Distribution of the number in system of a single-queue M/M/k that
+    # starts empty, at each of the given times: P(N(t) = n) is the state
+    # distribution after j uniformized steps averaged over the paths,
+    # weighted by the Poisson(rate * t) probability of j steps by time t.
+    # Returns a len(times) x (largest state + 1) array.
+    times = np.asarray(times, dtype=np.float64)
+    rate = uniformizationRate(params)
+    horizon = rate * times.max()
+    steps = int(horizon + 8.0 * math.sqrt(horizon) + 16)
+
+    # row j: how many paths are in each state after j steps; at step 0 all are empty
+    hist = [np.array([[paths]], dtype=np.int64)]
+    for states in uniformizedPaths(params, steps, paths, rng):
+        width = int(states.max()) + 1
+        rowOffset = np.arange(len(states))[:, np.newaxis] * width
+        hist.append(np.bincount((states + rowOffset).ravel(), minlength=len(states) * width).reshape(len(states), width))
+    width = max(h.shape[1] for h in hist)
+    stepDistribution = np.vstack([np.pad(h, ((0, 0), (0, width - h.shape[1]))) for h in hist]) / paths
+
+    # log of the Poisson probabilities of j = 0..steps jumps, for every time
+    j = np.arange(steps + 1)
+    logFactorial = np.concatenate(([0.0], np.cumsum(np.log(j[1:]))))
+    mean = rate * times[:, np.newaxis]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        logWeight = np.where(mean > 0, j * np.log(mean) - mean - logFactorial, np.where(j == 0, 0.0, -np.inf))
+    return np.exp(logWeight) @ stepDistribution
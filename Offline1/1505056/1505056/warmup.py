@@ -0,0 +1,73 @@
+"""
+Warm-up detection for steady-state runs that start empty and idle.
+
+The statistics of such a run are biased toward the empty system until the
+queue has filled up to its steady-state level. MSER (White's marginal
+standard error rule) picks the truncation point d of a series of
+observations y[0..n-1] that minimizes
+
+    MSER(d) = sum((y[i] - mean(y[d:]))^2 for i >= d) / (n - d)^2,
+
+i.e. the width of the confidence interval of the truncated mean: dropping
+more observations removes bias but leaves fewer to average. MSER-5 applies
+the rule to the means of consecutive batches of BATCH = 5 observations,
+which smooths the series enough for the minimum to be stable.
+
+Only d < n/2 is considered. A minimum at the very end of that range means
+the run is too short to have reached steady state at all, and a tail of
+equal observations (say, no customer waiting at all) makes the statistic
+zero wherever that tail starts; either way mserTruncation raises
+TruncationError rather than return a cut that means nothing, and the caller
+falls back to a fixed warm-up.
+
+The truncation point should come from a pilot run, not from the run whose
+statistics it truncates: MSER favours cutting just after a congested
+stretch, so a run truncated by its own series underestimates queue lengths
+and delays, by more than the empty start does. The pilot draws from lcgrand
+substream PILOT_SUBSTREAM (see pilotStream), which no replication uses, so
+it shares no random numbers with the runs it is used on.
+"""
+
+import numpy as np
+
+from lcgrand import RandomStream
+from lcgrand import SUBSTREAM_COUNT
+from lcgrand import SUBSTREAM_LENGTH
+from lcgrand import lcgrandsub
+
+
+BATCH = 5
+PILOT_SUBSTREAM = SUBSTREAM_COUNT - 2  # the last substream is the router's (see routing.py)
+
+
+class TruncationError(ValueError):
+    """MSER found no truncation point worth using in a series."""
+
+
+def pilotStream(draws):
+    # the RandomStream of a pilot run that takes about `draws` random numbers
+    if draws > SUBSTREAM_LENGTH:
+        raise ValueError('a pilot run of %d random numbers does not fit in a substream of %d' % (draws, SUBSTREAM_LENGTH))
+    return RandomStream(lcgrandsub(PILOT_SUBSTREAM))
+
+
+def mserTruncation(y):
+    # number of leading observations of y to drop, by the MSER rule
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n < 4:
+        raise TruncationError('MSER needs at least 4 observations, got %d' % n)
+    # sums over y[d:] for every d, from the end backwards
+    tailSum = np.cumsum(y[::-1])[::-1]
+    tailSumSq = np.cumsum((y * y)[::-1])[::-1]
+    kept = np.arange(n, 0, -1, dtype=np.float64)
+    sse = np.maximum(tailSumSq - tailSum * tailSum / kept, 0.0)
+    statistic = sse / (kept * kept)
+    last = (n + 1) // 2 - 1
+    d = int(np.argmin(statistic[:last + 1]))
+    if np.ptp(y[d:]) == 0.0:
+        raise TruncationError('observations %d to %d are all equal, so MSER cannot place the warm-up' % (d, n - 1))
+    if d == last:
+        raise TruncationError('MSER cut %d of %d observations, the most it may: the run is too short to reach steady state' % (d, n))
+    return d
+
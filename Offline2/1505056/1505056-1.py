@@ -6,37 +6,70 @@ ro is defined as the ratio of arrival rate vs service rate.
 For the sake of comparison, while plotting results from simulation, also produce the analytical results.
 """
 
-import heapq
+import itertools
+import sys
+import warnings
 import random
+from collections import deque
 import matplotlib.pyplot as plt
 import numpy as np
-import math
 
 from lcgrand import MODLUS
 from lcgrand import MULT1
 from lcgrand import MULT2
-from lcgrand import zrng
-from lcgrand import lcgrand
+from lcgrand import RandomStream
+from lcgrand import VariatePool
+from fel import HeapFEL
+from lcgrand import lcgrandsub
+from lcgrand import SUBSTREAM_COUNT
+from lcgrand import SUBSTREAM_LENGTH
+from lcgrand import VARIATE_BLOCK
+from discrete import DiscreteSampler
+from functools import partial
+from parallel import runReplications
+from parallel import runToPrecision
+from analysis import batchMeans
+from warmup import BATCH
+from warmup import mserTruncation
+from warmup import TruncationError
 
 IDLE = 0
 BUSY = 1
 
+#integer event type codes, cheaper to compare than strings
+START = 0
+ARRIVAL = 1
+DEPART = 2
+EXIT = 3
+EVENT_NAMES = ['START', 'ARRIVAL', 'DEPART', 'EXIT']
+
+
+def newEventType(name):
+    #add an event type (breakdown, reneging, shift change...) and return its code;
+    #give it a handler with Simulator.registerEvent
+    EVENT_NAMES.append(name)
+    return len(EVENT_NAMES) - 1
+
+
+BATCHEND = newEventType('BATCHEND') #end of a batch of a batch-means run
+
 
 # Parameters
 class Params:
-    def __init__(self, t, workStationNo, machinePerStation, jobTypes, jobProbs, stationPerJob, routing, serviceTime):
+    def __init__(self, t, workStationNo, machinePerStation, jobTypes, jobProbs, stationPerJob, routing, serviceTime, endTime=8, batchLength=0.0):
         self.meanArrivalTime = t #mean value
         self.workStationNo = workStationNo
         self.jobTypes = jobTypes
         self.machinePerStation = machinePerStation
         self.jobProbs = jobProbs
-        self.jobProbsCumulative = [self.jobProbs[i] for i in range(self.jobTypes)]
-        for i in range(1, self.jobTypes):
-            self.jobProbsCumulative[i] += self.jobProbsCumulative[i-1]
-        # print(self.jobProbsCumulative)
+        #job types are drawn from a cumulative table built once here
+        self.jobSampler = DiscreteSampler([i for i in range(self.jobTypes)], self.jobProbs)
+        self.jobProbsCumulative = self.jobSampler.cdf
         self.stationPerJob = stationPerJob
         self.routing = routing
         self.meanServiceTime = serviceTime #mean value
+        self.endTime = endTime #length of the run, in hours
+        self.batchLength = batchLength #if > 0, the accumulators are saved every batchLength hours (see States.snapshot)
     # Note meanArrivalTime and meanServiceTime are mean values, they are NOT rates i.e. (1/mean)
 
 
@@ -47,7 +80,9 @@ class States:
         self.queue = [] #this queue stores the arrival times
         self.status = [] #this holds the status of k servers
         self.numInQ = [0.0 for i in range(workStationNo)]
+        self.numInSystem = 0 #jobs in the shop, in service or in a queue; changes only when a job enters or leaves
         self.timeLastEvent = 0.0
+        self.timeLastQChange = [0.0 for i in range(workStationNo)] #areaNumInQ[i] is integrated up to this time
         
         #intermediate running statistics
         self.totalDelayQueue = []
@@ -57,6 +92,7 @@ class States:
         self.totalServedJob = []
         self.areaNumInQ = [0.0 for i in range(workStationNo)]
         self.areaJobNumber = 0.0
+        self.snapshots = [] #accumulators at the end of every batch, for batch means
 
         # Statistics
         self.avgJobNumber = 0.0
@@ -68,30 +104,43 @@ class States:
 
     def update(self, sim, event):
         #if the event is the START event
-        if event.eventType == 'START':
+        if event.eventType == START:
             return
 
         timeSincelastEvent = event.eventTime - self.timeLastEvent
         self.timeLastEvent = event.eventTime
         # # print(f'time since last event= {timeSincelastEvent}')
 
-        #update area under numberInQ curve
-        self.areaNumInQ = [self.areaNumInQ[i]+(self.numInQ[i] * timeSincelastEvent) for i in range(sim.params.workStationNo)]
-
-        #update area under server-busy indicator function
-        runningJobs = 0
-        for i in range(sim.params.workStationNo):
-            runningJobs += self.status[i]
-        for i in range(sim.params.workStationNo):
-            runningJobs += len(self.queue[i])
-        self.areaJobNumber += (runningJobs * timeSincelastEvent)
+        #the areas under the numberInQ curves are integrated in changeNumInQ, only for the station that changes
+        #update area under the number-of-jobs curve
+        self.areaJobNumber += (self.numInSystem * timeSincelastEvent)
         return
+
+    def changeNumInQ(self, workStationIdx:int, change, now):
+        #integrate the queue length of this station up to now, then change it
+        self.areaNumInQ[workStationIdx] += self.numInQ[workStationIdx] * (now - self.timeLastQChange[workStationIdx])
+        self.timeLastQChange[workStationIdx] = now
+        self.numInQ[workStationIdx] += change
         
 
+    def snapshot(self, now):
+        #save the accumulators as one flat row:
+        #time, totalDelayJob, jobsCount, totalDelayQueue, totalServedQ, areaNumInQ, areaJobNumber
+        #the queue areas are brought up to now first; update has already done so for areaJobNumber
+        for i in range(len(self.areaNumInQ)):
+            self.changeNumInQ(i, 0, now)
+        self.snapshots.append([now] + self.totalDelayJob + self.jobsCount + self.totalDelayQueue
+                              + self.totalServedQ + self.areaNumInQ + [self.areaJobNumber])
+
     def finish(self, sim):
         # print(f'total Delay: {self.totalDelay}')
-        self.avgJobDelay = [self.totalDelayJob[i]/self.jobsCount[i] for i in range(len(self.totalDelayJob))]
-        self.avgQdelay = [self.totalDelayQueue[i]/self.totalServedQ[i] for i in range(len(self.totalDelayQueue))]
+        #close the numberInQ areas at the end of the run
+        for i in range(sim.params.workStationNo):
+            self.changeNumInQ(i, 0, sim.simclock)
+        #a job type or queue nobody went through in this run has no average delay: it is NaN, and so
+        #is the overall delay of the run, and the averages over replications leave them out
+        self.avgJobDelay = [self.totalDelayJob[i]/self.jobsCount[i] if self.jobsCount[i] > 0 else np.nan for i in range(len(self.totalDelayJob))]
+        self.avgQdelay = [self.totalDelayQueue[i]/self.totalServedQ[i] if self.totalServedQ[i] > 0 else np.nan for i in range(len(self.totalDelayQueue))]
         for i in range(sim.params.jobTypes):
             self.overallDelay += sim.params.jobProbs[i]*self.avgJobDelay[i]
         self.avgQlength = [self.areaNumInQ[i]/sim.simclock for i in range(sim.params.workStationNo)]
@@ -122,7 +171,7 @@ class States:
         return False
 
     def initQueue(self, workStationNo:int):
-        self.queue = [[] for i in range(workStationNo)]
+        self.queue = [deque() for i in range(workStationNo)] #O(1) append and popleft
 
     def initDelayQ(self, workStationNo:int):
         self.totalDelayQueue = [0.0 for i in range(workStationNo)]
@@ -133,49 +182,60 @@ class States:
         self.totalServedJob = [0.0 for i in range(jobTypes)]
 
 class Event:
-    def __init__(self, sim):
-        self.eventType = None
-        self.sim = sim
-        self.eventTime = None
+    #slots keep events small; the type code lives on the class, not in every event
+    __slots__ = ('eventTime',)
+    eventType = None
+
+    def __init__(self, eventTime, sim):
+        self.eventTime = eventTime
 
     def process(self, sim):
         raise Exception('Unimplemented process method for the event!')
 
     def __repr__(self):
-        return self.eventType
+        return EVENT_NAMES[self.eventType]
 
 
 class StartEvent(Event):
-    def __init__(self, eventTime, sim):
-        self.eventTime = eventTime
-        self.eventType = 'START'
-        self.sim = sim
+    __slots__ = ()
+    eventType = START
 
     def process(self, sim):
         # this is the startEvent. It will enqueue an arrival event
         firstArrivalTime = self.eventTime + sim.expon(sim.params.meanArrivalTime)
         sim.scheduleEvent(ArrivalEvent(firstArrivalTime, sim))
-        sim.scheduleEvent(ExitEvent(8, sim))
+        sim.scheduleEvent(ExitEvent(sim.params.endTime, sim))
+        if sim.params.batchLength > 0:
+            sim.states.snapshot(self.eventTime)
+            sim.scheduleEvent(BatchEndEvent(self.eventTime + sim.params.batchLength, sim))
         
         
 
 
 class ExitEvent(Event):
-    def __init__(self, eventTime, sim):
-        self.eventTime = eventTime
-        self.eventType = 'EXIT'
-        self.sim = sim
+    __slots__ = ()
+    eventType = EXIT
 
     def process(self, sim):
         None
 
 
+class BatchEndEvent(Event):
+    __slots__ = ()
+    eventType = BATCHEND
+
+    def process(self, sim):
+        #a batch is over: save the accumulators and start the next one
+        sim.states.snapshot(sim.simclock)
+        sim.scheduleEvent(BatchEndEvent(sim.simclock + sim.params.batchLength, sim))
+
+
 class ArrivalEvent(Event):
-    # Write __init__ function
+    __slots__ = ('jobType', 'taskNo')
+    eventType = ARRIVAL
+
     def __init__(self, eventTime ,sim):
         self.eventTime = eventTime
-        self.sim = sim
-        self.eventType = 'ARRIVAL'
         self.jobType = None #this is calculated as 0 indexed
         self.taskNo = None #this is calculated as 1 indexed
 
@@ -183,13 +243,9 @@ class ArrivalEvent(Event):
         #check if this a new arrival to the system or an already existing job visiting another station
         if self.jobType == None:
             #this is a new arrival to the system, give this a job type
-            self.jobType = np.random.choice([i for i in range(sim.params.jobTypes)], p = np.array(sim.params.jobProbs))
-            # tempProb = np.random.uniform()
-            # for i in range(sim.params.jobTypes):
-            #     if tempProb<=sim.params.jobProbsCumulative[i]:
-            #         self.jobType = i
-            #         break
+            self.jobType = sim.params.jobSampler.sample(sim.generator)
             sim.states.jobsCount[self.jobType] += 1
+            sim.states.numInSystem += 1
             # print('job type for the new arrival: ',self.jobType)
             #set the taskNo to 1
             self.taskNo = 1 #taskNo is 1-indexed
@@ -208,7 +264,7 @@ class ArrivalEvent(Event):
         freeServer = sim.states.checkStatus(workStationIdx, sim.params.machinePerStation[workStationIdx])
         if freeServer == False:
             #if all the servers are busy, then put the event in the queue
-            sim.states.numInQ[workStationIdx] += 1
+            sim.states.changeNumInQ(workStationIdx, 1, sim.simclock)
             sim.states.queue[workStationIdx].append(self) #this is the arrival event
         else:
             delay = 0.0
@@ -226,11 +282,11 @@ class ArrivalEvent(Event):
 
 
 class DepartureEvent(Event):
-    
+    __slots__ = ('jobType', 'taskNo')
+    eventType = DEPART
+
     def __init__(self, eventTime, sim, jobType:int, taskNo:int):
         self.eventTime = eventTime
-        self.eventType = 'DEPART'
-        self.sim = sim
         self.jobType = jobType #0 indexed
         self.taskNo = taskNo #1 indexed
 
@@ -247,7 +303,7 @@ class DepartureEvent(Event):
 
         else:
             #queue of this particular server is nonempty, so let the first person in queue receive service
-            sim.states.numInQ[workStationIdx] -= 1
+            sim.states.changeNumInQ(workStationIdx, -1, sim.simclock)
 
             #then we get the arrival time of the first person
             #in the queue(sim.states.queue) and calculate the delay faced
@@ -261,7 +317,7 @@ class DepartureEvent(Event):
             temp = sim.erlang(sim.params.meanServiceTime[nextEvent.jobType][nextEvent.taskNo-1])
             departureTime = sim.simclock + temp
             sim.scheduleEvent(DepartureEvent(departureTime, sim, jobType=nextEvent.jobType, taskNo=nextEvent.taskNo))
-            sim.states.queue[workStationIdx] = sim.states.queue[workStationIdx][1:]
+            sim.states.queue[workStationIdx].popleft()
 
         #figure out if it was the last task for this job
         #if this was not the last task
@@ -278,14 +334,29 @@ class DepartureEvent(Event):
             #if this was the last task,
             #increase the number of jobs completed
             sim.states.totalServedJob[self.jobType] += 1
+            sim.states.numInSystem -= 1
 
 
 
 class Simulator:
-    def __init__(self, seed):
-        self.eventQ = [] #this stores the arrival and departure events
+    def __init__(self, seed, rng=None, fel=None, generator=None):
+        #the future event list stores the arrival and departure events; a binary heap unless another list is given
+        self.eventQ = fel if fel is not None else HeapFEL()
+        self.eventSeq = itertools.count() #sequence numbers break ties between events at the same time
+        #dispatch table: event type code -> handler(event, sim)
+        self.handlers = []
+        self.registerEvent(START, StartEvent.process)
+        self.registerEvent(ARRIVAL, ArrivalEvent.process)
+        self.registerEvent(DEPART, DepartureEvent.process)
+        self.registerEvent(BATCHEND, BatchEndEvent.process)
         self.simclock = 0
         self.seed = seed
+        #every simulator owns its random stream; by default it starts at the seed of lcgrand stream 1
+        self.rng = rng if rng is not None else RandomStream()
+        #and its own numpy generator for everything not drawn from lcgrand; by default seeded with seed
+        self.generator = generator if generator is not None else np.random.default_rng(seed)
+        #expon and erlang read their draws from pre-filled blocks of this stream
+        self.variates = VariatePool(self.rng)
         self.params = None
         self.states = None
 
@@ -304,26 +375,35 @@ class Simulator:
     def now(self):
         return self.simclock
 
+    def registerEvent(self, eventType:int, handler):
+        #handler(event, sim) runs for every event of this type, right after States.update
+        while len(self.handlers) <= eventType:
+            self.handlers.append(None)
+        self.handlers[eventType] = handler
+
     def scheduleEvent(self, event):
-        #heapq is a priority queue
-        heapq.heappush(self.eventQ, (event.eventTime, event))
+        self.eventQ.push((event.eventTime, next(self.eventSeq), event))
 
     def run(self):
-        # np.random.seed(self.seed)
         self.initialize()
 
-        while len(self.eventQ) > 0:
-            time, event = heapq.heappop(self.eventQ)
-            if event.eventType == 'EXIT':
+        #the loop only touches locals: pop, update the statistics, dispatch on the type code
+        eventQ = self.eventQ
+        pop = eventQ.pop
+        handlers = self.handlers
+        update = self.states.update
+        while eventQ:
+            time, seq, event = pop()
+            eventType = event.eventType
+            if eventType == EXIT:
                 break
 
             #states are the performance matrices i.e. avg_q_len, avg_delay etc
-            if self.states != None:
-                self.states.update(self, event)
+            update(self, event)
 
             # print(event.eventTime, 'Event', event)
-            self.simclock = event.eventTime
-            event.process(self)
+            self.simclock = time
+            handlers[eventType](event, self)
             # print('status: ',self.states.status)
             # print('queue: ',self.states.queue)
         # print('jobs count: ',self.states.jobsCount)
@@ -337,17 +417,41 @@ class Simulator:
         return self.states.getResults(self)
 
     def expon(self, mean):
-        return (-mean * math.log(lcgrand(1)))
+        return self.variates.expon(mean)
 
     def erlang(self, mean):
-        return self.expon(mean/2) + self.expon(mean/2)
+        return self.variates.erlang(2, mean)
         # return random.expovariate(1/mean)
 
 
-def experiment1():
+def makeReplication(params, replication:int, length:int = SUBSTREAM_LENGTH):
+    #the Simulator of one replication: arrivals and services come from lcgrand substream `replication`
+    #(of `length` numbers, see substreamLength), and the job types from a numpy generator seeded from
+    #the replication number
+    seed = 101
+    sim = Simulator(seed, rng=RandomStream(lcgrandsub(replication, length)), generator=np.random.default_rng((seed, replication)))
+    sim.configure(params, States(params.jobTypes, params.workStationNo))
+    return sim
+
+
+def substreamLength(params):
+    #lcgrand numbers to set aside for one run of params: every job takes an interarrival time and an
+    #Erlang-2 service time (two numbers) at each of its stations. The expected count is padded for its
+    #spread and for what the variate pool reads ahead, and rounded up to a power-of-two multiple of
+    #SUBSTREAM_LENGTH, so substream r of that length covers whole default substreams
+    perJob = 1 + 2 * sum(p * n for p, n in zip(params.jobProbs, params.stationPerJob))
+    expected = params.endTime / params.meanArrivalTime * perJob
+    draws = expected + 6.0 * np.sqrt(expected * perJob) + VARIATE_BLOCK
+    length = SUBSTREAM_LENGTH
+    while length < draws:
+        length *= 2
+    return length
+
+
+def readParams(path='config.txt'):
     #read in the input params from text file
     inputLines = []
-    with open('config.txt', 'r') as f:
+    with open(path, 'r') as f:
         inputLines = f.readlines()
     
     stationNumber = int(inputLines[0].strip('\n'))
@@ -363,58 +467,203 @@ def experiment1():
         routing[idx] = [int(n.strip('\n')) - 1 for n in inputLines[6+idx*2].split()] #counters are stored as 0-indexed
         serviceTime[idx] = [float(n.strip('\n')) for n in inputLines[7+idx*2].split()]
     
+    params = Params(t=interArrivalMean, 
+                    workStationNo=stationNumber, 
+                    machinePerStation=machinesNumber, 
+                    jobTypes=jobNo, 
+                    jobProbs=jobProbs,
+                    stationPerJob=stationPerJob,
+                    routing=routing,
+                    serviceTime=serviceTime)
+    return params
+
+
+def averageObserved(total, observed:int, replications:int):
+    #the average of a delay over the replications that observed it, noting how many did not
+    if observed == replications:
+        return total/replications
+    if observed == 0:
+        return 'no observations in %d replications' % replications
+    return '%s (no observations in %d of %d replications)' % (total/observed, replications - observed, replications)
+
+
+def experiment1(replications=30, workers=None):
+    params = readParams()
+    stationNumber = params.workStationNo
+    jobNo = params.jobTypes
+
+    #the replications run in parallel on every core; each one has its own random streams,
+    #so the results are the same for any number of workers
+    results = runReplications(partial(makeReplication, params), replications, workers=workers,
+                              onResult=lambda r, result: print('iteration: ',r+1))
+
     avgJobDelay = [0.0 for i in range(jobNo)]
     avgQdelay = [0.0 for i in range(stationNumber)]
     avgQlen = [0.0 for i in range(stationNumber)]
     avgOverallDelay = 0.0
     avgJobNumber = 0.0
     
-    np.random.seed(101)
-    for i in range(30):
-        print('iteration: ',i+1)
-        zrng[1] = 1973272912
-        seed = 101
-        sim = Simulator(seed)
-        sim.configure(Params(t=interArrivalMean, 
-                        workStationNo=stationNumber, 
-                        machinePerStation=machinesNumber, 
-                        jobTypes=jobNo, 
-                        jobProbs=jobProbs,
-                        stationPerJob=stationPerJob,
-                        routing=routing,
-                        serviceTime=serviceTime), 
-                        States(jobNo,stationNumber))
-        sim.run()
-        jobDelay, overallDelay, Qdelay, Qlen, jobNumber = sim.getResults()
-        avgJobDelay = [avgJobDelay[i]+jobDelay[i] for i in range(jobNo)]
-        avgOverallDelay += overallDelay
-        avgQdelay = [avgQdelay[i]+Qdelay[i] for i in range(stationNumber)]
+    #add up in replication order; a delay is NaN in a replication where nobody went through
+    #that job type or queue, so it is averaged over the other replications and the gap is reported
+    delayCount = [0 for i in range(jobNo)]
+    overallCount = 0
+    QdelayCount = [0 for i in range(stationNumber)]
+    for jobDelay, overallDelay, Qdelay, Qlen, jobNumber in results:
+        for i in range(jobNo):
+            if not np.isnan(jobDelay[i]):
+                avgJobDelay[i] += jobDelay[i]
+                delayCount[i] += 1
+        if not np.isnan(overallDelay):
+            avgOverallDelay += overallDelay
+            overallCount += 1
+        for i in range(stationNumber):
+            if not np.isnan(Qdelay[i]):
+                avgQdelay[i] += Qdelay[i]
+                QdelayCount[i] += 1
         avgQlen = [avgQlen[i]+Qlen[i] for i in range(stationNumber)]
         avgJobNumber += jobNumber
     
     print('Avg Job Delay')
     for i in range(jobNo):
-        print('job ',i+1, ': ',avgJobDelay[i]/30.0)
+        print('job ',i+1, ': ',averageObserved(avgJobDelay[i], delayCount[i], replications))
     
-    print('Over all delay: ',avgOverallDelay/30.0)
+    print('Over all delay: ',averageObserved(avgOverallDelay, overallCount, replications))
 
     print('Avg Q Delay')
     for i in range(stationNumber):
-        print('Queue ',i+1, ': ',avgQdelay[i]/30.0)
+        print('Queue ',i+1, ': ',averageObserved(avgQdelay[i], QdelayCount[i], replications))
     
     print('Avg Q Len')
     for i in range(stationNumber):
-        print('Queue ',i+1, ': ',avgQlen[i]/30.0)
+        print('Queue ',i+1, ': ',avgQlen[i]/replications)
 
-    print('Avg Job Number: ',avgJobNumber/30.0)
+    print('Avg Job Number: ',avgJobNumber/replications)
     # print(sim.params.jobProbs)
     # sim.printResults()    
 
 
-def main():
-    print("Task 1")
-    experiment1()
+def experiment1Precise(relWidth=0.1, level=0.95, maxReplications=None, workers=None):
+    #experiment1 without a fixed number of replications: replications are added until the confidence
+    #intervals of the overall delay and of every queue delay are within relWidth of their means.
+    #Replication r runs on lcgrand substream r, so there can be at most SUBSTREAM_COUNT of them (the default)
+    if maxReplications is None or maxReplications > SUBSTREAM_COUNT:
+        maxReplications = SUBSTREAM_COUNT
+    params = readParams()
+    results, mean, halfWidth = runToPrecision(partial(makeReplication, params),
+                                              lambda result: [result[1]] + list(result[2]),
+                                              relWidth, level=level, maxReplications=maxReplications, workers=workers)
+
+    print('replications: ', len(results))
+    print('Over all delay: ', mean[0], ' +- ', halfWidth[0])
+    print('Avg Q Delay')
+    for i in range(params.workStationNo):
+        print('Queue ', i+1, ': ', mean[1+i], ' +- ', halfWidth[1+i])
+
+
+def batchMetrics(params, increments):
+    #batch means from rows of accumulator increments (see States.snapshot): the delay of every job type,
+    #the overall delay, the delay in and length of every queue, and the number of jobs in the shop
+    J = params.jobTypes
+    S = params.workStationNo
+    time = increments[:, :1]
+    delayJob, jobs, delayQ, servedQ, areaQ, areaJobs = np.split(increments[:, 1:], np.cumsum([J, J, S, S, S]), axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        jobDelay = np.where(jobs > 0, delayJob / jobs, np.nan)
+        qDelay = np.where(servedQ > 0, delayQ / servedQ, np.nan)
+    overallDelay = jobDelay @ np.asarray(params.jobProbs)[:, None]
+    return np.hstack((jobDelay, overallDelay, qDelay, areaQ / time, areaJobs / time))
+
+
+def detectWarmup(params, replication=1):
+    #end of the warm-up of a long run of params, by MSER-5 on a pilot run; the pilot is replication 1, with
+    #substreams sized for the run, so it shares no numbers with the run it is applied to (replication 0, see
+    #warmup.py). MSER runs on the means of every metric over BATCH batches at a time, and the warm-up ends at
+    #the latest of their points
+    sim = makeReplication(params, replication, substreamLength(params))
+    sim.run()
+    snapshots = np.array(sim.states.snapshots)[::BATCH]
+    values = batchMetrics(params, np.diff(snapshots, axis=0))
+    #(a metric with an empty batch, NaN, is left out); if MSER cannot tell, there is no warm-up to drop
+    observed = [j for j in range(values.shape[1]) if not np.isnan(values[:, j]).any()]
+    try:
+        if not observed:
+            raise TruncationError('every metric has an empty batch in the pilot run')
+        d = max(mserTruncation(values[:, j]) for j in observed)
+    except TruncationError as error:
+        warnings.warn('%s; dropping no warm-up' % error)
+        return 0.0
+    return snapshots[d, 0]
+
+
+def batchInterval(mean, halfWidth, lag1, m:int):
+    #metric m of experiment1Batched as mean +- half-width, or as the mean alone when its batches are too
+    #correlated for a confidence interval
+    if np.isinf(halfWidth[m]):
+        return '%s  (lag-1 autocorrelation %f, no confidence interval)' % (mean[m], lag1[m])
+    return '%s  +-  %s' % (mean[m], halfWidth[m])
+
+
+def experiment1Batched(endTime=8*365*20, batchLength=8, warmupTime=None, minBatches=20, maxLag1=0.1, level=0.95):
+    #experiment1 as one long run (by default twenty years of 8-hour days) analysed by batch means, paying for
+    #the warm-up once instead of once per replication: the first warmupTime hours (by default found by
+    #detectWarmup) are dropped, the rest is cut into batches of batchLength hours (one day), and batches are
+    #merged until no batch mean keeps a lag-1 autocorrelation above maxLag1 beyond sampling noise (see
+    #correlatedBatches), down to minBatches batches. A metric whose batches are still significantly correlated
+    #gets no confidence interval. Station 2 runs at a utilisation near 0.99, so its queue stays correlated over
+    #years: a ten-year run cannot separate its batches
+    params = readParams()
+    params.endTime = endTime
+    params.batchLength = batchLength
+    if warmupTime is None:
+        warmupTime = detectWarmup(params)
+    sim = makeReplication(params, 0, substreamLength(params))
+    sim.run()
+
+    snapshots = np.array(sim.states.snapshots)
+    snapshots = snapshots[snapshots[:, 0] >= warmupTime]
+    batches, mean, halfWidth, lag1, correlated = batchMeans(np.diff(snapshots, axis=0), partial(batchMetrics, params),
+                                                            minBatches=minBatches, maxLag1=maxLag1, level=level)
+    J = params.jobTypes
+    S = params.workStationNo
+
+    #batches still significantly correlated after the last merge: no interval for those metrics
+    if correlated.any():
+        warnings.warn('the batch means of %d of %d metrics keep a significant lag-1 autocorrelation; run longer for their confidence intervals'
+                      % (np.count_nonzero(correlated), len(lag1)))
+    halfWidth = np.where(correlated, np.inf, halfWidth)
+
+    print('warm-up: ', warmupTime, ' hours')
+    print('batches: ', batches, ' of ', (len(snapshots) - 1) * batchLength / batches, ' hours, lag-1 autocorrelation up to ', lag1.max())
+    print('Avg Job Delay')
+    for i in range(J):
+        print('job ', i+1, ': ', batchInterval(mean, halfWidth, lag1, i))
+    print('Over all delay: ', batchInterval(mean, halfWidth, lag1, J))
+    print('Avg Q Delay')
+    for i in range(S):
+        print('Queue ', i+1, ': ', batchInterval(mean, halfWidth, lag1, J+1+i))
+    print('Avg Q Len')
+    for i in range(S):
+        print('Queue ', i+1, ': ', batchInterval(mean, halfWidth, lag1, J+1+S+i))
+    print('Avg Job Number: ', batchInterval(mean, halfWidth, lag1, len(mean)-1))
+    return batches, mean, halfWidth, lag1
+
+
+def main(mode='replications'):
+    #python 1505056-1.py           Task 1 over a fixed number of replications
+    #python 1505056-1.py precise   Task 1 with replications added until the confidence intervals are 10% wide
+    #python 1505056-1.py batched   Task 1 as one long run analysed by batch means
+    if mode == 'replications':
+        print("Task 1")
+        experiment1()
+    elif mode == 'precise':
+        print("Task 1, to a 10% confidence interval")
+        experiment1Precise()
+    elif mode == 'batched':
+        print("Task 1, one long run with batch means")
+        experiment1Batched()
+    else:
+        raise ValueError('unknown mode %r: use replications, precise or batched' % mode)
 
 
 if __name__ == "__main__":
-    main()
+    main(*sys.argv[1:])
@@ -6,17 +6,27 @@ ro is defined as the ratio of arrival rate vs service rate.
 For the sake of comparison, while plotting results from simulation, also produce the analytical results.
 """
 
-import heapq
+import itertools
+import sys
 import random
+from collections import deque
 import numpy as np
-import math
 
 import matplotlib.pyplot as plt
 from lcgrand import MODLUS
 from lcgrand import MULT1
 from lcgrand import MULT2
-from lcgrand import zrng
-from lcgrand import lcgrand
+from lcgrand import RandomStream
+from lcgrand import VariatePool
+from lcgrand import lcgrandsub
+from fel import HeapFEL
+from routing import QueueIndex
+from routing import lowestFree
+from discrete import DiscreteSampler
+from parallel import paramGrid
+from parallel import runSweep
+from parallel import runToPrecision
+from functools import partial
 
 IDLE = 0
 BUSY = 1
@@ -25,6 +35,20 @@ SANDWICH = 2
 DRINKS = 3
 CASHIER = 4
 
+#integer event type codes, cheaper to compare than strings
+START = 0
+ARRIVAL = 1
+DEPART = 2
+EXIT = 3
+EVENT_NAMES = ['START', 'ARRIVAL', 'DEPART', 'EXIT']
+
+
+def newEventType(name):
+    #add an event type (breakdown, reneging, shift change...) and return its code;
+    #give it a handler with Simulator.registerEvent
+    EVENT_NAMES.append(name)
+    return len(EVENT_NAMES) - 1
+
 # Parameters
 class Params:
     def __init__(self, meanArrivalTime, groupSizeProbs, routes, routeProbs, staff, ST, ACT):
@@ -35,6 +59,9 @@ class Params:
         self.staff = staff
         self.ST = ST
         self.ACT = ACT
+        #group sizes and routes are drawn from cumulative tables built once here
+        self.groupSizeSampler = DiscreteSampler([i+1 for i in range(len(groupSizeProbs))], groupSizeProbs)
+        self.routeSampler = DiscreteSampler([i+1 for i in range(len(routes))], routeProbs)
 
     # Note meanArrival time is a mean value
 
@@ -47,8 +74,12 @@ class States:
         self.cashierQueue = [] #stores arrival time at queues in cashier counters
         self.foodStatus = [] #this holds the status of food servers
         self.cashierStatus = [] #this holds the status of the cashiers
+        self.freeCashiers = 0 #bitset: bit i is set while cashier i is IDLE
+        self.cashierQueueIndex = None #lengths of the cashier queues, with the leftmost shortest one at hand
         self.numInQ = [0.0 for i in range(3)] #for storing number of people in hotfood, sandwich and all cashier queues respectively
+        self.numCustomers = 0 #customers being served or queued at the food counters and cashiers, counted where they come and go
         self.timeLastEvent = 0.0
+        self.timeLastQChange = [0.0 for i in range(3)] #areaNumInQ[i] is integrated up to this time
         
         # #intermediate running statistics
         self.totalQDelay = [0.0 for i in range(3)] #index-0: hotfood, index-1: sandwich, index-2: cashiers
@@ -74,32 +105,34 @@ class States:
 
     def update(self, sim, event):
         #if the event is the START event
-        if event.eventType == 'START':
+        if event.eventType == START:
             return
 
         timeSincelastEvent = event.eventTime - self.timeLastEvent
         self.timeLastEvent = event.eventTime
 
-        #update area under numberInQ curve
-        self.areaNumInQ = [self.areaNumInQ[i]+(self.numInQ[i] * timeSincelastEvent) for i in range(3)]
-
-        #update area under server-busy indicator function
-        totalCustomers = 0
-        for i in range(2):
-            totalCustomers += self.foodStatus[i]
-        for i in range(sim.params.staff[2]):
-            totalCustomers += self.cashierStatus[i]
-        for i in range(2):
-            totalCustomers += len(self.foodQueue[i])
-        for i in range(sim.params.staff[2]):
-            totalCustomers += len(self.cashierQueue[i])
-        self.areaCustomerNumber += (totalCustomers * timeSincelastEvent)   
-        self.maxCustomerNumber = max(self.maxCustomerNumber, totalCustomers)    
+        #the areas under the numberInQ curves are integrated in changeNumInQ, only for the queue that changes
+        #update area under the number-of-customers curve
+        self.areaCustomerNumber += (self.numCustomers * timeSincelastEvent)
+        self.maxCustomerNumber = max(self.maxCustomerNumber, self.numCustomers)
+
+    def changeNumInQ(self, i:int, change, now):
+        #integrate the length of queue i (hotfood, sandwich, cashiers) up to now, then change it
+        self.areaNumInQ[i] += self.numInQ[i] * (now - self.timeLastQChange[i])
+        self.timeLastQChange[i] = now
+        self.numInQ[i] += change
+        if self.numInQ[i] > self.maxNumInQ[i]:
+            self.maxNumInQ[i] = self.numInQ[i]
 
     def finish(self, sim):
         # print(f'total Delay: {self.totalDelay}')
-        self.avgQdelay = [self.totalQDelay[i]/self.totalQServed[i] for i in range(3)]
-        self.avgTypeDelay = [self.totalTypeDelay[i]/self.totalTypeServed[i] for i in range(3)]
+        #close the numberInQ areas at the end of the run
+        for i in range(3):
+            self.changeNumInQ(i, 0, sim.simclock)
+        #a counter or route nobody went through in this day has no average delay: it is NaN, and so
+        #is the overall delay of the day, and the confidence intervals over days leave them out
+        self.avgQdelay = [self.totalQDelay[i]/self.totalQServed[i] if self.totalQServed[i] > 0 else np.nan for i in range(3)]
+        self.avgTypeDelay = [self.totalTypeDelay[i]/self.totalTypeServed[i] if self.totalTypeServed[i] > 0 else np.nan for i in range(3)]
         for i in range(3):
             self.avgOverallDelay += self.avgTypeDelay[i]*sim.params.routeProbs[i]
         self.avgQlength = [self.areaNumInQ[i]/sim.simclock for i in range(3)]
@@ -123,55 +156,50 @@ class States:
     def initStatus(self, staff:list):
         self.foodStatus = [IDLE for i in range(2)]
         self.cashierStatus = [IDLE for i in range(staff[CASHIER-2])]
+        self.freeCashiers = (1 << staff[CASHIER-2]) - 1
 
     def checkFoodStatus(self, counterNo): #counterNo is 1-indexed
         return self.foodStatus[counterNo-1]
 
     def findShortestCashierQueue(self, staff): #returns 0-indexed value
-        #first look for the cashier who is idle
-        for i in range(staff[2]):
-            if self.cashierStatus[i] == IDLE:
-                return i
-        #if none of the cashiers is free, find the shortest Queue
-        shortestQueue = 0
-        for i in range(1,staff[2]):
-            if len(self.cashierQueue[i])<len(self.cashierQueue[shortestQueue]):
-                shortestQueue = i
-        return shortestQueue
+        #first look for the cashier who is idle, the lowest one in the free-cashier bitset
+        if self.freeCashiers:
+            return lowestFree(self.freeCashiers)
+        #if none of the cashiers is free, take the leftmost shortest queue from the index
+        return self.cashierQueueIndex.shortest()
 
     def initQueue(self, staff:list):
-        self.foodQueue = [[] for i in range(2)]
-        self.cashierQueue = [[] for i in range(staff[CASHIER-2])]
+        #deques: O(1) append and popleft
+        self.foodQueue = [deque() for i in range(2)]
+        self.cashierQueue = [deque() for i in range(staff[CASHIER-2])]
+        self.cashierQueueIndex = QueueIndex(staff[CASHIER-2])
 
 
 
 
 class Event:
-    def __init__(self, sim):
-        self.eventType = None
-        self.sim = sim
-        self.eventTime = None
+    #slots keep events small; the type code lives on the class, not in every event
+    __slots__ = ('eventTime',)
+    eventType = None
+
+    def __init__(self, eventTime, sim):
+        self.eventTime = eventTime
 
     def process(self, sim):
         raise Exception('Unimplemented process method for the event!')
 
     def __repr__(self):
-        return self.eventType
-
-    def __lt__(self,other):
-        return self.eventTime < other.eventTime
+        return EVENT_NAMES[self.eventType]
 
 class StartEvent(Event):
-    def __init__(self, eventTime, sim):
-        self.eventTime = eventTime
-        self.eventType = 'START'
-        self.sim = sim
+    __slots__ = ()
+    eventType = START
 
     def process(self, sim):
         # this is the startEvent. It will enqueue an arrival event
         firstArrivalTime = self.eventTime + sim.expon(sim.params.meanArrivalTime)
         #figure out the size of the first arriving group
-        groupSize = np.random.choice([i+1 for i in range(4)], p=sim.params.groupSizeProbs)
+        groupSize = sim.params.groupSizeSampler.sample(sim.generator)
         for i in range(groupSize):
             sim.scheduleEvent(ArrivalEvent(firstArrivalTime, sim, groupId=1, taskNo=1 , act=0.0, routingId=None))
         sim.scheduleEvent(ExitEvent(90*60, sim))
@@ -180,21 +208,19 @@ class StartEvent(Event):
 
 
 class ExitEvent(Event):
-    def __init__(self, eventTime, sim):
-        self.eventTime = eventTime
-        self.eventType = 'EXIT'
-        self.sim = sim
+    __slots__ = ()
+    eventType = EXIT
 
     def process(self, sim):
         None
 
 
 class ArrivalEvent(Event):
-    # Write __init__ function
+    __slots__ = ('groupId', 'taskNo', 'routingId', 'act')
+    eventType = ARRIVAL
+
     def __init__(self, eventTime ,sim, groupId, taskNo, act, routingId):
         self.eventTime = eventTime
-        self.sim = sim
-        self.eventType = 'ARRIVAL'
         self.groupId = groupId
         self.taskNo = taskNo #1 indexed
         self.routingId = routingId #1 indexed
@@ -207,7 +233,7 @@ class ArrivalEvent(Event):
             sim.states.groupId = self.groupId + 1
             temp = sim.expon(sim.params.meanArrivalTime)
             nextArrival = sim.simclock + temp
-            groupSize = np.random.choice([i+1 for i in range(4)], p=sim.params.groupSizeProbs)
+            groupSize = sim.params.groupSizeSampler.sample(sim.generator)
             for i in range(groupSize):
                 sim.scheduleEvent(ArrivalEvent(nextArrival, sim, groupId=sim.states.groupId, taskNo=1 ,act=0.0, routingId=None))
             # sim.scheduleEvent(ArrivalEvent(nextArrival, sim, groupId=sim.states.groupId, taskNo=1 ,act=0.0, routingId=None) )
@@ -215,7 +241,7 @@ class ArrivalEvent(Event):
         #if the customer is visiting the first ever counter
         if self.taskNo == 1:
             #assign a routing Id
-            self.routingId = np.random.choice( [i+1 for i in range(len(sim.params.routes))], p=sim.params.routeProbs )
+            self.routingId = sim.params.routeSampler.sample(sim.generator)
             #update totalTypeServed
             sim.states.totalTypeServed[self.routingId-1] += 1
         
@@ -229,8 +255,8 @@ class ArrivalEvent(Event):
             #check to see if any counter is free
             status = sim.states.checkFoodStatus(counterNo)
             if status == BUSY:
-                sim.states.numInQ[counterNo-1] += 1
-                sim.states.maxNumInQ[counterNo-1] = max(sim.states.maxNumInQ[counterNo-1], sim.states.numInQ[counterNo-1])
+                sim.states.changeNumInQ(counterNo-1, 1, sim.simclock)
+                sim.states.numCustomers += 1
                 #the counter is busy, append it to the queue
                 sim.states.foodQueue[counterNo-1].append(self) #this is the arrival event
                 # print(sim.states.queue)
@@ -248,19 +274,20 @@ class ArrivalEvent(Event):
                 #increment the number of customers served and make server busy
                 sim.states.totalQServed[counterNo-1] += 1
                 sim.states.foodStatus[counterNo-1] = BUSY
+                sim.states.numCustomers += 1
 
                 #calculate nextAct for this service
-                nextAct = self.act + np.random.uniform(sim.params.ACT[counterNo-1][0],sim.params.ACT[counterNo-1][1])
+                nextAct = self.act + sim.generator.uniform(sim.params.ACT[counterNo-1][0],sim.params.ACT[counterNo-1][1])
                 #create the departure event for this arrival
-                temp = np.random.uniform(sim.params.ST[counterNo-1][0], sim.params.ST[counterNo-1][1])
+                temp = sim.generator.uniform(sim.params.ST[counterNo-1][0], sim.params.ST[counterNo-1][1])
                 departureTime = sim.simclock + temp
                 sim.scheduleEvent(DepartureEvent(departureTime, sim, groupId=self.groupId, taskNo=self.taskNo, routingId=self.routingId, act=nextAct, cashierNo=None))
         #the customer is at DRINKs
         elif counterNo < CASHIER:
             #accumulate act
-            nextAct = self.act + np.random.uniform(sim.params.ACT[counterNo-1][0],sim.params.ACT[counterNo-1][1])
+            nextAct = self.act + sim.generator.uniform(sim.params.ACT[counterNo-1][0],sim.params.ACT[counterNo-1][1])
             #schedule departure time using ST
-            temp = np.random.uniform(sim.params.ST[counterNo-1][0],sim.params.ST[counterNo-1][1])
+            temp = sim.generator.uniform(sim.params.ST[counterNo-1][0],sim.params.ST[counterNo-1][1])
             departureTime = sim.simclock + temp
             sim.scheduleEvent(DepartureEvent(departureTime, sim, groupId=self.groupId, taskNo=self.taskNo, routingId=self.routingId, act=nextAct, cashierNo=None))
 
@@ -283,6 +310,8 @@ class ArrivalEvent(Event):
                 #increment the number of customers served and make server busy
                 sim.states.totalQServed[counterNo-2] += 1
                 sim.states.cashierStatus[cashierNo] = BUSY
+                sim.states.freeCashiers ^= 1 << cashierNo
+                sim.states.numCustomers += 1
 
                 #no need to calculate nextACT because there will be no arrival event after this departure
                 #schedule the departure event based on ACT
@@ -291,17 +320,18 @@ class ArrivalEvent(Event):
                 sim.scheduleEvent(DepartureEvent(departureTime, sim, groupId=self.groupId, taskNo=self.taskNo, routingId=self.routingId, act=0.0, cashierNo=cashierNo))
             #if the cashier is busy, join the queue
             else:
-                sim.states.numInQ[counterNo-2] += 1
-                sim.states.maxNumInQ[counterNo-2] = max(sim.states.maxNumInQ[counterNo-2], sim.states.numInQ[counterNo-2])
+                sim.states.changeNumInQ(counterNo-2, 1, sim.simclock)
+                sim.states.numCustomers += 1
                 sim.states.cashierQueue[cashierNo].append(self)
+                sim.states.cashierQueueIndex.change(cashierNo, 1)
 
 
 class DepartureEvent(Event):
-    
+    __slots__ = ('groupId', 'taskNo', 'routingId', 'act', 'cashierNo')
+    eventType = DEPART
+
     def __init__(self, eventTime, sim, groupId:int, routingId:int, taskNo:int, act, cashierNo):
         self.eventTime = eventTime
-        self.eventType = 'DEPART'
-        self.sim = sim
         self.groupId = groupId
         self.taskNo = taskNo #1-indexed
         self.routingId = routingId #1-indexed
@@ -317,6 +347,8 @@ class DepartureEvent(Event):
         counterNo = sim.params.routes[self.routingId-1][self.taskNo-1]
         #if the customer is leaving from either Hotfood or Sandwich
         if counterNo<DRINKS:
+            #the customer leaves the food counter, whether or not someone from the queue takes its place
+            sim.states.numCustomers -= 1
         #if there is no one in the particular queue from which the departure event is being issued, make the server idle
             if len(sim.states.foodQueue[counterNo-1])==0:
                 sim.states.foodStatus[counterNo-1] = IDLE
@@ -326,7 +358,7 @@ class DepartureEvent(Event):
                 newEvent = sim.states.foodQueue[counterNo-1][0]
 
                 #decrease the number of people in this particular queue
-                sim.states.numInQ[counterNo-1] -= 1
+                sim.states.changeNumInQ(counterNo-1, -1, sim.simclock)
 
                 #calculate the delay faced
                 delay = sim.simclock - newEvent.eventTime
@@ -342,29 +374,31 @@ class DepartureEvent(Event):
 
                 #increment the number of customers served and calculate act for this event
                 sim.states.totalQServed[counterNo-1] += 1
-                nextAct = newEvent.act + np.random.uniform(sim.params.ACT[counterNo-1][0],sim.params.ACT[counterNo-1][1])
+                nextAct = newEvent.act + sim.generator.uniform(sim.params.ACT[counterNo-1][0],sim.params.ACT[counterNo-1][1])
                 
                 #schedule departure time using ST
-                temp = np.random.uniform(sim.params.ST[counterNo-1][0],sim.params.ST[counterNo-1][1])
+                temp = sim.generator.uniform(sim.params.ST[counterNo-1][0],sim.params.ST[counterNo-1][1])
                 # print(temp)
                 departureTime = sim.simclock + temp
                 sim.scheduleEvent(DepartureEvent(departureTime, sim, groupId=newEvent.groupId, taskNo=newEvent.taskNo, routingId=newEvent.routingId, act=nextAct, cashierNo=None))
 
                 #move everyone in the queue one step up
-                sim.states.foodQueue[counterNo-1] = sim.states.foodQueue[counterNo-1][1:]
+                sim.states.foodQueue[counterNo-1].popleft()
         #if the customer was leaving from Drinks, there is nothing to be done for the next event in the queue, because there is no queue
         # if the customer was leaving from Cashier, there are things to be done, because there is a queue
         elif  counterNo == CASHIER:
             sim.states.totalServed += 1 #increment totalServed while leaving from cashier
+            sim.states.numCustomers -= 1
             #if the queue is empty, make the cashier idle
             if len(sim.states.cashierQueue[self.cashierNo]) == 0:
                 sim.states.cashierStatus[self.cashierNo] = IDLE
+                sim.states.freeCashiers |= 1 << self.cashierNo
             else:
                 #get the next customer at this cashier counter
                 newEvent = sim.states.cashierQueue[self.cashierNo][0]
                 
                 #decrease the number of people in this particular queue
-                sim.states.numInQ[counterNo-2] -= 1
+                sim.states.changeNumInQ(counterNo-2, -1, sim.simclock)
 
                 #calculate the delay faced
                 delay = sim.simclock - newEvent.eventTime
@@ -385,7 +419,8 @@ class DepartureEvent(Event):
                 sim.scheduleEvent(DepartureEvent(departureTime, sim, groupId=newEvent.groupId, taskNo=newEvent.taskNo, routingId=newEvent.routingId, act=0.0, cashierNo=self.cashierNo))
 
                 #move everyone in the queue one position up
-                sim.states.cashierQueue[self.cashierNo] = sim.states.cashierQueue[self.cashierNo][1:]
+                sim.states.cashierQueue[self.cashierNo].popleft()
+                sim.states.cashierQueueIndex.change(self.cashierNo, -1)
                 
         #if the customer was leaving from anywhere but the cashier's, an arrival event has to be created for going to the next counter
         if counterNo != CASHIER:
@@ -394,10 +429,23 @@ class DepartureEvent(Event):
             sim.scheduleEvent(ArrivalEvent(sim.simclock, sim, sim.states.groupId, taskNo=self.taskNo+1, act=self.act, routingId=self.routingId))
 
 class Simulator:
-    def __init__(self, seed):
-        self.eventQ = [] #this stores the arrival and departure events
+    def __init__(self, seed, rng=None, fel=None, generator=None):
+        #the future event list stores the arrival and departure events; a binary heap unless another list is given
+        self.eventQ = fel if fel is not None else HeapFEL()
+        self.eventSeq = itertools.count() #sequence numbers break ties between events at the same time
+        #dispatch table: event type code -> handler(event, sim)
+        self.handlers = []
+        self.registerEvent(START, StartEvent.process)
+        self.registerEvent(ARRIVAL, ArrivalEvent.process)
+        self.registerEvent(DEPART, DepartureEvent.process)
         self.simclock = 0
         self.seed = seed
+        #every simulator owns its random stream; by default it starts at the seed of lcgrand stream 1
+        self.rng = rng if rng is not None else RandomStream()
+        #and its own numpy generator for everything not drawn from lcgrand; by default seeded with seed
+        self.generator = generator if generator is not None else np.random.default_rng(seed)
+        #expon and erlang read their draws from pre-filled blocks of this stream
+        self.variates = VariatePool(self.rng)
         self.params = None
         self.states = None
 
@@ -418,28 +466,38 @@ class Simulator:
     def now(self):
         return self.simclock
 
+    def registerEvent(self, eventType:int, handler):
+        #handler(event, sim) runs for every event of this type, right after States.update
+        while len(self.handlers) <= eventType:
+            self.handlers.append(None)
+        self.handlers[eventType] = handler
+
     def scheduleEvent(self, event):
-        #heapq is a priority queue
-        heapq.heappush(self.eventQ, (event.eventTime, event))
+        self.eventQ.push((event.eventTime, next(self.eventSeq), event))
 
     def run(self):
         # random.seed(self.seed)
         self.initialize()
 
-        while len(self.eventQ) > 0:
-            time, event = heapq.heappop(self.eventQ)
+        #the loop only touches locals: pop, update the statistics, dispatch on the type code
+        eventQ = self.eventQ
+        pop = eventQ.pop
+        handlers = self.handlers
+        update = self.states.update
+        while eventQ:
+            time, seq, event = pop()
 
             # print('time: ', time,'\nevent: ',event)
-            if event.eventType == 'EXIT':
+            eventType = event.eventType
+            if eventType == EXIT:
                 # event.process(self)
                 break
 
             #states are the performance matrices i.e. avg_q_len, avg_delay etc
-            if self.states != None:
-                self.states.update(self, event)
+            update(self, event)
 
-            self.simclock = event.eventTime
-            event.process(self)
+            self.simclock = time
+            handlers[eventType](event, self)
             # print('foodQueue: ',self.states.foodQueue)
             # print('foodStatus: ',self.states.foodStatus)
             # print('cashierQueue: ',self.states.cashierQueue)
@@ -455,16 +513,14 @@ class Simulator:
         return self.states.getResults(self)
 
     def expon(self, mean):
-        return (-mean * math.log(lcgrand(1)))
+        return self.variates.expon(mean)
         # return np.random.exponential(mean)
 
 
 def base_case():
     print('Base model')
     seed = 101
-    np.random.seed(seed)
     
-    zrng[1] = 1973272912
     sim = Simulator(seed)
     sim.configure(Params(meanArrivalTime=30,
                         groupSizeProbs= [0.5, 0.3, 0.1, 0.1],
@@ -519,9 +575,7 @@ def base_case():
 def thirdCashier():
     print('[1,1,3]')
     seed = 101
-    np.random.seed(seed)
     
-    zrng[1] = 1973272912
     sim = Simulator(seed)
     sim.configure(Params(meanArrivalTime=30,
                         groupSizeProbs= [0.5, 0.3, 0.1, 0.1],
@@ -574,9 +628,7 @@ def thirdCashier():
 def exp3():
     print('[2,1,2]')
     seed = 101
-    np.random.seed(seed)
     
-    zrng[1] = 1973272912
     sim = Simulator(seed)
     sim.configure(Params(meanArrivalTime=30,
                         groupSizeProbs= [0.5, 0.3, 0.1, 0.1],
@@ -629,9 +681,7 @@ def exp3():
 def exp4():
     print('[1,2,2]')
     seed = 101
-    np.random.seed(seed)
     
-    zrng[1] = 1973272912
     sim = Simulator(seed)
     sim.configure(Params(meanArrivalTime=30,
                         groupSizeProbs= [0.5, 0.3, 0.1, 0.1],
@@ -684,9 +734,7 @@ def exp4():
 def exp5():
     print('[2,2,2]')
     seed = 101
-    np.random.seed(seed)
     
-    zrng[1] = 1973272912
     sim = Simulator(seed)
     sim.configure(Params(meanArrivalTime=30,
                         groupSizeProbs= [0.5, 0.3, 0.1, 0.1],
@@ -739,9 +787,7 @@ def exp5():
 def exp6():
     print('[2,1,3]')
     seed = 101
-    np.random.seed(seed)
     
-    zrng[1] = 1973272912
     sim = Simulator(seed)
     sim.configure(Params(meanArrivalTime=30,
                         groupSizeProbs= [0.5, 0.3, 0.1, 0.1],
@@ -794,9 +840,7 @@ def exp6():
 def exp7():
     print('[1,2,3]')
     seed = 101
-    np.random.seed(seed)
     
-    zrng[1] = 1973272912
     sim = Simulator(seed)
     sim.configure(Params(meanArrivalTime=30,
                         groupSizeProbs= [0.5, 0.3, 0.1, 0.1],
@@ -849,9 +893,7 @@ def exp7():
 def exp8():
     print('[2,2,3]')
     seed = 101
-    np.random.seed(seed)
     
-    zrng[1] = 1973272912
     sim = Simulator(seed)
     sim.configure(Params(meanArrivalTime=30,
                         groupSizeProbs= [0.5, 0.3, 0.1, 0.1],
@@ -901,15 +943,86 @@ def exp8():
     print('maxCustomerNumber: ', maxCustomerNumber)
     print('Total Served: ', totalServed,'\n')
 
-def main():
-    base_case()
-    thirdCashier()
-    exp3()
-    exp4()
-    exp5()
-    exp6()
-    exp7()
-    exp8()
+def staffParams(hotFood, sandwich, cashiers):
+    #the base case with the given staff; as in exp3..exp8, a second server at a food counter
+    #is modelled as one server working twice as fast
+    return Params(meanArrivalTime=30,
+                groupSizeProbs= [0.5, 0.3, 0.1, 0.1],
+                routes= [[HOTFOOD,DRINKS,CASHIER], [SANDWICH,DRINKS,CASHIER],[DRINKS,CASHIER]],
+                routeProbs = [0.8, 0.15, 0.05],
+                staff= [hotFood,sandwich,cashiers],
+                ST= [(50.0/hotFood,120.0/hotFood),(60/sandwich,180/sandwich),(5.0,20.0)],
+                ACT= [(20.0/hotFood,40.0/hotFood),(5.0/sandwich,15.0/sandwich),(5.0,10.0)]
+                )
+
+
+def runStaffing(cell):
+    #one cell of the staffing sweep, run in a worker process: seeded like base_case, so every cell
+    #gives the same results as its hand-written function
+    seed = 101
+    sim = Simulator(seed)
+    sim.configure(staffParams(**cell), States())
+    sim.run()
+    return sim.getResults()
+
+
+def staffingSweep(hotFood=[1,2], sandwich=[1,2], cashiers=[2,3], workers=None):
+    #every staffing of the grid (by default the eight cases of base_case, thirdCashier and exp3..exp8),
+    #run in parallel worker processes; returns one row per staffing for plotting
+    cells = paramGrid(hotFood=hotFood, sandwich=sandwich, cashiers=cashiers)
+    table = []
+    for cell, results in zip(cells, runSweep(runStaffing, cells, workers=workers)):
+        avgQdelay, maxQDelay, avgTypeDelay, maxTypeDelay, avgOverallDelay, avgQlength, maxQlength, avgCustomerNumber, maxCustomerNumber, totalServed = results
+        table.append(([cell['hotFood'], cell['sandwich'], cell['cashiers']], avgOverallDelay/60.0, avgCustomerNumber, maxCustomerNumber, totalServed))
+
+    print('%10s %14s %18s %18s %12s' % ('staff', 'overallDelay', 'avgCustomerNumber', 'maxCustomerNumber', 'Total Served'))
+    for staff, overallDelay, avgCustomerNumber, maxCustomerNumber, totalServed in table:
+        print('%10s %14.6f %18.6f %18d %12d' % (staff, overallDelay, avgCustomerNumber, maxCustomerNumber, totalServed))
+    return table
+
+
+def makeDay(params, replication:int):
+    #the Simulator of one independent day: the arrivals come from lcgrand substream `replication`, and the
+    #group sizes, routes and times from a numpy generator seeded from the replication number
+    sim = Simulator(101, rng=RandomStream(lcgrandsub(replication)), generator=np.random.default_rng((101, replication)))
+    sim.configure(params, States())
+    return sim
+
+
+def staffingPrecise(hotFood=[1,2], sandwich=[1,2], cashiers=[2,3], relWidth=0.05, maxReplications=1000, workers=None):
+    #the staffing grid with confidence intervals: every staffing gets independent days until its overall delay
+    #and average number of customers are known within relWidth, so the noisiest staffings get the most days
+    print('%10s %6s %22s %26s' % ('staff', 'days', 'overallDelay', 'avgCustomerNumber'))
+    table = []
+    for cell in paramGrid(hotFood=hotFood, sandwich=sandwich, cashiers=cashiers):
+        results, mean, halfWidth = runToPrecision(partial(makeDay, staffParams(**cell)),
+                                                  lambda result: [result[4], result[7]],
+                                                  relWidth, maxReplications=maxReplications, workers=workers)
+        staff = [cell['hotFood'], cell['sandwich'], cell['cashiers']]
+        table.append((staff, len(results), mean[0]/60.0, halfWidth[0]/60.0, mean[1], halfWidth[1]))
+        print('%10s %6d %11.6f +- %7.6f %13.6f +- %9.6f' % tuple(table[-1]))
+    return table
+
+
+def main(mode='report'):
+    #python 1505056-2.py          the report of every staffing, one after the other
+    #python 1505056-2.py sweep    the same staffings as one parallel sweep, in one table
+    #python 1505056-2.py precise  every staffing over as many days as its confidence intervals need
+    if mode == 'sweep':
+        staffingSweep()
+    elif mode == 'precise':
+        staffingPrecise()
+    elif mode == 'report':
+        base_case()
+        thirdCashier()
+        exp3()
+        exp4()
+        exp5()
+        exp6()
+        exp7()
+        exp8()
+    else:
+        raise ValueError('unknown mode %r: use report, sweep or precise' % mode)
 
 if __name__ == "__main__":
-    main()
+    main(*sys.argv[1:])
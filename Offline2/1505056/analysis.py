@@ -0,0 +1,155 @@
+"""
+Output analysis helpers shared by the simulation drivers: Student-t quantiles,
+confidence intervals over independent replications, ratio estimators for
+regenerative cycles, and batch means for a single long run.
+No scipy is needed; the t quantile is computed from the closed-form CDF for
+integer degrees of freedom.
+"""
+
+import math
+from statistics import NormalDist
+
+import numpy as np
+
+
+def _tAbsCdf(t, dof:int):
+    # P(|T| < t) for Student's t with an integer number of degrees of freedom.
+    theta = math.atan(t / math.sqrt(dof))
+    s = math.sin(theta)
+    c = math.cos(theta)
+    c2 = c * c
+    if dof == 1:
+        return 2.0 / math.pi * theta
+    if dof % 2 == 1:
+        term = 1.0
+        total = 1.0
+        for j in range(1, (dof - 1) // 2):
+            term *= c2 * (2 * j) / (2 * j + 1)
+            total += term
+        return 2.0 / math.pi * (theta + s * c * total)
+    term = 1.0
+    total = 1.0
+    for j in range(1, dof // 2):
+        term *= c2 * (2 * j - 1) / (2 * j)
+        total += term
+    return s * total
+
+
+def tQuantile(p, dof:int):
+    # Quantile of order p (0.5 < p < 1) of Student's t with dof degrees of freedom.
+    if not 0.5 < p < 1.0 or dof < 1:
+        raise ValueError('tQuantile needs 0.5 < p < 1 and dof >= 1')
+    if dof > 200:
+        # Cornish-Fisher expansion around the normal quantile, exact to ~1e-9 here
+        z = NormalDist().inv_cdf(p)
+        g1 = (z**3 + z) / 4
+        g2 = (5*z**5 + 16*z**3 + 3*z) / 96
+        g3 = (3*z**7 + 19*z**5 + 17*z**3 - 15*z) / 384
+        return z + g1/dof + g2/dof**2 + g3/dof**3
+
+    target = 2.0 * p - 1.0
+    lo, hi = 0.0, 1.0
+    while _tAbsCdf(hi, dof) < target:
+        hi *= 2.0
+    for i in range(100):
+        mid = 0.5 * (lo + hi)
+        if _tAbsCdf(mid, dof) < target:
+            lo = mid
+        else:
+            hi = mid
+    return 0.5 * (lo + hi)
+
+
+def confidenceInterval(samples, level=0.95):
+    # Mean and t-based half-width of independent observations.
+    # samples may be 2-D (one row per replication, one column per metric), in
+    # which case both results are arrays with one entry per column.
+    # NaN marks a missing observation (say a queue nobody went through in a
+    # replication) and is left out, so each column then has its own count.
+    x = np.asarray(samples, dtype=np.float64)
+    if np.isnan(x).any():
+        return _observedInterval(x, level)
+    n = x.shape[0]
+    mean = x.mean(axis=0)
+    if n < 2:
+        return mean, np.full(np.shape(mean), np.inf)
+    halfWidth = tQuantile(0.5 + level / 2.0, n - 1) * x.std(axis=0, ddof=1) / math.sqrt(n)
+    return mean, halfWidth
+
+
+def _observedInterval(x, level):
+    # confidenceInterval column by column over the observations that are not NaN
+    columns = x.reshape(x.shape[0], -1)
+    mean = np.full(columns.shape[1], np.nan)
+    halfWidth = np.full(columns.shape[1], np.inf)
+    for j in range(columns.shape[1]):
+        c = columns[~np.isnan(columns[:, j]), j]
+        n = len(c)
+        if n > 0:
+            mean[j] = c.mean()
+        if n > 1:
+            halfWidth[j] = tQuantile(0.5 + level / 2.0, n - 1) * c.std(ddof=1) / math.sqrt(n)
+    return mean.reshape(x.shape[1:]), halfWidth.reshape(x.shape[1:])
+
+
+def ratioInterval(y, x, level=0.95):
+    # Ratio estimate sum(y) / sum(x) and its t-based half-width from
+    # independent pairs (y[i], x[i]), such as the sums over the cycles of a
+    # regenerative run; each column is a separate ratio. The half-width is the
+    # standard deviation of y[i] - ratio * x[i] over mean(x) * sqrt(n).
+    y = np.asarray(y, dtype=np.float64)
+    x = np.asarray(x, dtype=np.float64)
+    n = y.shape[0]
+    ratio = y.sum(axis=0) / x.sum(axis=0)
+    if n < 2:
+        return ratio, np.full(np.shape(ratio), np.inf)
+    z = y - ratio * x
+    halfWidth = tQuantile(0.5 + level / 2.0, n - 1) * z.std(axis=0, ddof=1) / (x.mean(axis=0) * math.sqrt(n))
+    return ratio, halfWidth
+
+
+def lag1Autocorrelation(samples):
+    # Lag-1 sample autocorrelation of every column of samples (one row per
+    # observation); 0 for a column that does not vary. A NaN (missing)
+    # observation adds nothing to the sums.
+    x = np.asarray(samples, dtype=np.float64)
+    observed = ~np.isnan(x)
+    if not observed.all():
+        mean = np.where(observed, x, 0.0).sum(axis=0) / np.maximum(observed.sum(axis=0), 1)
+        x = np.where(observed, x, mean)
+    d = x - x.mean(axis=0)
+    variance = (d * d).sum(axis=0)
+    covariance = (d[1:] * d[:-1]).sum(axis=0)
+    return np.divide(covariance, variance, out=np.zeros_like(variance), where=variance > 0.0)
+
+
+def correlatedBatches(lag1, batches:int, maxLag1=0.1):
+    # Which lag-1 autocorrelations of batch means over batches batches are
+    # too high to treat the batches as independent: above maxLag1 and above
+    # 2 / sqrt(batches), about the 95% bound of the sample lag-1 of that many
+    # independent batches, so sampling noise alone does not count.
+    return np.asarray(lag1) > max(maxLag1, 2.0 / math.sqrt(batches))
+
+
+def batchMeans(increments, metrics, minBatches:int = 20, maxLag1=0.1, level=0.95):
+    # Batch-means confidence intervals from one long run.
+    # increments holds one row per batch with what the accumulators of the run
+    # gained over it (delay totals, counts, areas, elapsed time...), and
+    # metrics(increments) turns those rows into rows of batch means. Adjacent
+    # batches are merged pairwise, adding their increments, until no metric has
+    # correlatedBatches or another merge would leave fewer than minBatches
+    # batches (an odd last batch is dropped).
+    # Returns (batches, mean, halfWidth, lag1, correlated) for the final
+    # batching; a correlated metric means the run was too short for batches
+    # that independent, and its halfWidth is not to be trusted.
+    x = np.asarray(increments, dtype=np.float64)
+    while True:
+        values = metrics(x)
+        lag1 = lag1Autocorrelation(values)
+        correlated = correlatedBatches(lag1, max(len(x), 1), maxLag1)
+        if len(x) // 2 < minBatches or not correlated.any():
+            break
+        m = len(x) // 2 * 2
+        x = x[0:m:2] + x[1:m:2]
+    mean, halfWidth = confidenceInterval(values, level)
+    return len(x), mean, halfWidth, lag1, correlated
@@ -0,0 +1,38 @@
+"""
+Table-driven sampling from a finite discrete distribution.
+
+DiscreteSampler builds the normalized cumulative table once, the same way
+np.random.choice does internally, and then draws by bisecting it, without
+rebuilding lists and arrays on every call. The uniforms come from the
+np.random.Generator passed to sample and sampleBatch (a Simulator passes its
+own), so the sampler holds no random state and can be shared by simulators.
+"""
+
+from bisect import bisect_right
+
+import numpy as np
+
+
+class DiscreteSampler:
+    __slots__ = ('values', 'probs', 'cdf', 'cdfArray', 'valuesArray')
+
+    def __init__(self, values, probs):
+        p = np.array(probs, dtype=np.float64)
+        if len(values) != len(p) or len(p) == 0:
+            raise ValueError('values and probs must be non-empty and of the same length')
+        if np.any(p < 0) or abs(p.sum() - 1.0) > np.sqrt(np.finfo(np.float64).eps):
+            raise ValueError('probs must be non-negative and sum to 1')
+        cdf = p.cumsum()
+        cdf /= cdf[-1]
+        self.values = list(values)
+        self.probs = p
+        self.cdfArray = cdf
+        self.cdf = cdf.tolist()
+        self.valuesArray = np.array(self.values)
+
+    def sample(self, generator):
+        return self.values[bisect_right(self.cdf, generator.random())]
+
+    def sampleBatch(self, generator, n:int):
+        idx = np.searchsorted(self.cdfArray, generator.random(n), side='right')
+        return self.valuesArray[idx]
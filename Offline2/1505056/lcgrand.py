@@ -4,9 +4,14 @@
 #    using these functions by executing
 
 #    before referencing the functions. 
+from math import log
+
+import numpy as np
+
 MODLUS = 2147483647
 MULT1  = 24112
 MULT2  = 26143
+MULT   = (MULT1 * MULT2) % MODLUS  # one lcgrand call advances zrng by MULT1*MULT2
 
 #  Prime modulus multiplicative linear congruential generator
 #    Z[i] = (630360016 * Z[i-1]) (mod(pow(2,31) - 1)), based on Marse and Roberts'
@@ -16,7 +21,8 @@ MULT2  = 26143
 #    lcgrand.h must be included in the calling program (#include "lcgrand.h")
 #    before using these functions.
 
-#    Usage: (Three functions)
+#    Usage: (Six functions, see also the RandomStream and VariatePool classes
+#    at the bottom)
 
 #    1. To obtain the next U(0,1) random number from stream "stream," execute
 #           u = lcgrand(stream);
@@ -34,6 +40,24 @@ MULT2  = 26143
 #           zget = lcgrandgt(stream);
 #       where lcgrandgt is a long function. 
 
+#    4. To obtain the next n U(0,1) random numbers from stream "stream" as a
+#       numpy array, execute
+#           u = lcgrand_batch(stream, n);
+#       The values are exactly those n successive calls to lcgrand(stream)
+#       would return, and the seed of the stream is left where those calls
+#       would leave it.
+
+#    5. To skip stream "stream" n numbers ahead in O(log n) time, execute
+#           lcgrandjump(stream, n);
+#       which leaves the stream exactly where n calls to lcgrand would.
+
+#    6. To give stream "stream" its own non-overlapping segment of the
+#       sequence (one per replication or worker), execute
+#           lcgrandsubst(stream, substream);
+#       Substreams 0, 1, 2, ... are consecutive blocks of SUBSTREAM_LENGTH
+#       numbers placed after the segments of the 100 default streams, so they
+#       never overlap each other or any default stream.
+
 #  Define the constants. 
 
 #  Set the default seeds for all 100 streams. 
@@ -57,23 +81,23 @@ zrng =[        1,
   190641742,1645390429, 264907697, 620389253,1502074852, 927711160,
   364849192,2049576050, 638580085, 547070247 ]
 
-#  Generate the next random number. 
+#  Untouched copy of the default seeds, used as the origin for substreams. 
+ZRNG_DEFAULT = tuple(zrng)
+
+STREAM_SPACING   = 100000                    # distance between default streams
+SUBSTREAM_BASE   = 100 * STREAM_SPACING      # first number past the 100 streams
+SUBSTREAM_LENGTH = 1 << 20                   # numbers reserved per substream
+SUBSTREAM_COUNT  = (MODLUS - 1 - SUBSTREAM_BASE) // SUBSTREAM_LENGTH  # full-length substreams in the period
+VARIATE_BLOCK    = 1 << 13                   # largest VariatePool refill
+VARIATE_FIRST    = 1 << 8                    # first VariatePool refill
+
+#  Generate the next random number. Python integers do not overflow, so the
+#    two Schrage rounds of the C version (MULT1 then MULT2) collapse into one
+#    multiplication by MULT; the sequence is the same. 
 
 def lcgrand(stream:int):
 
-    zi     = zrng[stream]
-    lowprd = (zi & 65535) * MULT1
-    hi31   = (zi >> 16) * MULT1 + (lowprd >> 16)
-    zi     = ((lowprd & 65535) - MODLUS) +\
-             ((hi31 & 32767) << 16) + (hi31 >> 15)
-    if (zi < 0):
-         zi += MODLUS
-    lowprd = (zi & 65535) * MULT2
-    hi31   = (zi >> 16) * MULT2 + (lowprd >> 16)
-    zi     = ((lowprd & 65535) - MODLUS) +\
-             ((hi31 & 32767) << 16) + (hi31 >> 15)
-    if (zi < 0):
-         zi += MODLUS
+    zi = (zrng[stream] * MULT) % MODLUS
     zrng[stream] = zi
     
     return (zi >> 7 | 1) / 16777216.0
@@ -88,3 +112,177 @@ def lcgrandgt (stream:int):#  Return the current zrng for stream "stream".
     return zrng[stream]
 
 
+def _multpowers(n:int):
+    # Return [MULT^1, MULT^2, ..., MULT^n] (mod MODLUS) as an int64 array.
+    # The table is built by doubling, so it costs O(log n) numpy operations.
+    # Every factor is below 2^31, so products fit in 62 bits and never overflow.
+    pows = np.empty(n, dtype=np.int64)
+    if n == 0:
+        return pows
+    pows[0] = MULT
+    filled = 1
+    while filled < n:
+        step = min(filled, n - filled)
+        pows[filled:filled+step] = (pows[:step] * pows[filled-1]) % MODLUS
+        filled += step
+    return pows
+
+
+POWER_BLOCK = 1 << 16                        # seeds computed per step of _lcgbatch
+_powers = _multpowers(POWER_BLOCK)           # built once, so batch draws only multiply by their seed
+_powers.flags.writeable = False
+
+
+def _lcgbatch(zi, n:int):
+    # Return the next n seeds after zi as an int64 array, POWER_BLOCK at a
+    # time: each block is the power table times the last seed of the block
+    # before it, so the table stays the same size whatever n is.
+    z = np.empty(n, dtype=np.int64)
+    for first in range(0, n, POWER_BLOCK):
+        block = z[first:first+POWER_BLOCK]
+        np.multiply(_powers[:len(block)], zi, out=block)
+        np.remainder(block, MODLUS, out=block)
+        zi = int(block[-1])
+    return z
+
+
+def lcgrand_batch(stream:int, n:int):
+    # Generate the next n random numbers of stream "stream" in one go.
+    z = _lcgbatch(zrng[stream], n)
+    if n > 0:
+        zrng[stream] = int(z[-1])
+
+    return ((z >> 7) | 1) / 16777216.0
+
+
+def lcgrandskip(zset, n:int):
+    # Return the seed n steps after zset without touching any stream.
+    # MULT^n is reduced mod the period MODLUS-1, so negative n jumps back.
+    return (zset * pow(MULT, n % (MODLUS - 1), MODLUS)) % MODLUS
+
+
+def lcgrandjump(stream:int, n:int):
+    # Advance stream "stream" by n numbers.
+    zrng[stream] = lcgrandskip(zrng[stream], n)
+
+
+def lcgrandsub(substream:int, length:int = SUBSTREAM_LENGTH):
+    # Return the first seed of substream "substream" (0-indexed).
+    if substream < 0 or length < 1:
+        raise ValueError('substream must be >= 0 and length >= 1')
+    if SUBSTREAM_BASE + (substream + 1) * length > MODLUS - 1:
+        raise ValueError('substream %d of length %d runs past the period of lcgrand' % (substream, length))
+    return lcgrandskip(ZRNG_DEFAULT[1], SUBSTREAM_BASE + substream * length)
+
+
+def lcgrandsubst(stream:int, substream:int, length:int = SUBSTREAM_LENGTH):
+    # Set the seed of stream "stream" to the start of substream "substream".
+    zrng[stream] = lcgrandsub(substream, length)
+
+
+class RandomStream:
+    """
+    A single lcgrand stream that owns its seed instead of sharing the
+    module-level zrng list, so every Simulator can carry its own generator.
+    Draws are identical to lcgrand() on a stream started from the same seed.
+    """
+    __slots__ = ('zi',)
+
+    def __init__(self, zset:int = ZRNG_DEFAULT[1]):
+        self.zi = zset
+
+    def uniform(self):
+        zi = (self.zi * MULT) % MODLUS
+        self.zi = zi
+        return (zi >> 7 | 1) / 16777216.0
+
+    def expon(self, mean):
+        return (-mean * log(self.uniform()))
+
+    def uniformBatch(self, n:int):
+        z = _lcgbatch(self.zi, n)
+        if n > 0:
+            self.zi = int(z[-1])
+        return ((z >> 7) | 1) / 16777216.0
+
+    def exponBatch(self, mean, n:int):
+        # math.log is applied element by element because np.log may differ
+        # from it in the last bit, which would break seed reproducibility.
+        u = self.uniformBatch(n)
+        return -mean * np.fromiter(map(log, u.tolist()), dtype=np.float64, count=n)
+
+    def jump(self, n:int):
+        self.zi = lcgrandskip(self.zi, n)
+
+    def getSeed(self):
+        return self.zi
+
+    def setSeed(self, zset:int):
+        self.zi = zset
+
+
+class VariatePool:
+    """
+    Hands out exponential and Erlang-k variates from pre-filled blocks of a
+    RandomStream, so a scalar draw costs one list read. The pool stores unit
+    exponentials -log(u) and scales them on the way out, which gives exactly
+    the values RandomStream.expon would give, in the same order.
+    Blocks start small and double up to blockSize, so short runs do not pay
+    for draws they never use.
+    """
+    __slots__ = ('rng', 'blockSize', 'nextSize', 'block', 'buf', 'idx')
+
+    def __init__(self, rng:RandomStream, blockSize:int = VARIATE_BLOCK):
+        self.rng = rng
+        self.blockSize = blockSize
+        self.nextSize = min(VARIATE_FIRST, blockSize)
+        self.block = np.empty(0)
+        self.buf = []
+        self.idx = 0
+
+    def refill(self):
+        u = self.rng.uniformBatch(self.nextSize).tolist()
+        self.nextSize = min(2 * self.nextSize, self.blockSize)
+        self.buf = [-log(x) for x in u]
+        self.block = np.array(self.buf)
+        self.idx = 0
+
+    def expon(self, mean):
+        i = self.idx
+        if i == len(self.buf):
+            self.refill()
+            i = 0
+        self.idx = i + 1
+        return mean * self.buf[i]
+
+    def erlang(self, k:int, mean):
+        # sum of k exponentials with mean mean/k, added left to right
+        m = mean / k
+        total = self.expon(m)
+        for i in range(k - 1):
+            total += self.expon(m)
+        return total
+
+    def unitBatch(self, n:int):
+        # next n unit exponentials as an array, continuing the scalar sequence
+        out = np.empty(n)
+        filled = 0
+        while filled < n:
+            if self.idx == len(self.buf):
+                self.refill()
+            take = min(n - filled, len(self.buf) - self.idx)
+            out[filled:filled+take] = self.block[self.idx:self.idx+take]
+            self.idx += take
+            filled += take
+        return out
+
+    def exponBatch(self, mean, n:int):
+        return mean * self.unitBatch(n)
+
+    def erlangBatch(self, k:int, mean, n:int):
+        e = self.unitBatch(n * k).reshape(n, k)
+        m = mean / k
+        total = m * e[:, 0]
+        for j in range(1, k):
+            total += m * e[:, j]
+        return total
@@ -0,0 +1,151 @@
+"""
+Running independent simulations in worker processes.
+
+runReplications runs replication 0..n-1 of a model on a process pool and
+returns their results in replication order; runSweep does the same for the
+cells of a scenario grid (see paramGrid), and runToPrecision keeps adding
+replications until the confidence intervals of chosen metrics are narrow
+enough. The model is given as a factory:
+factory(replication) builds a configured Simulator, and everything random in
+it must follow from the replication number (its lcgrand substream, and a seed
+for any global generator it uses). Each result then depends on nothing but
+its replication number, so the output is the same, bit for bit, for any
+number of workers, including workers=1, which runs in this process.
+
+The factory must be picklable: a module-level function, or a functools.partial
+of one with picklable arguments.
+"""
+
+import contextlib
+import itertools
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import as_completed
+
+import numpy as np
+
+from analysis import confidenceInterval
+
+
+def availableCores():
+    # cores this process may run on (all of them unless an affinity mask is set)
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def runReplication(factory, replication:int):
+    sim = factory(replication)
+    sim.run()
+    return sim.getResults()
+
+
+def runReplications(factory, replications:int, workers=None, onResult=None):
+    # Results of replications 0..replications-1, in that order.
+    # workers defaults to every available core. onResult(replication, result)
+    # is called as each replication finishes, in whatever order they finish;
+    # anything that adds results up should do it from the returned list so the
+    # sum does not depend on the finishing order.
+    if workers is None:
+        workers = availableCores()
+    workers = max(1, min(workers, replications))
+    if workers == 1:
+        return _runBatch(None, factory, 0, replications, onResult)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return _runBatch(executor, factory, 0, replications, onResult)
+
+
+def _runBatch(executor, factory, first:int, stop:int, onResult):
+    # results of replications first..stop-1 in that order, run on executor,
+    # or in this process when executor is None
+    results = [None] * (stop - first)
+    if executor is None:
+        for r in range(first, stop):
+            results[r - first] = runReplication(factory, r)
+            if onResult is not None:
+                onResult(r, results[r - first])
+        return results
+
+    futures = {executor.submit(runReplication, factory, r): r for r in range(first, stop)}
+    for future in as_completed(futures):
+        r = futures[future]
+        results[r - first] = future.result()
+        if onResult is not None:
+            onResult(r, results[r - first])
+    return results
+
+
+def runToPrecision(factory, metrics, relWidth, level=0.95, minReplications:int = 10, maxReplications:int = 1000,
+                   workers=None, onResult=None):
+    # Sequential stopping: runs replications 0, 1, 2, ... until the level
+    # confidence interval of every watched metric has a half-width of at most
+    # relWidth times its mean, or until maxReplications have run (the budget).
+    # metrics(result) picks the watched values out of one result, e.g.
+    # lambda result: [result[1]].
+    # Replications run in rounds on one pool. After each round the number
+    # still needed is estimated from the current half-widths, which shrink
+    # like 1/sqrt(n), and the next round runs up to that number (at most
+    # doubling the total). The rounds depend only on the results, so the
+    # stopping point is the same for any number of workers too.
+    # Returns (results, mean, halfWidth), the last two over the metrics.
+    if minReplications < 2:
+        raise ValueError('runToPrecision needs minReplications >= 2')
+    if workers is None:
+        workers = availableCores()
+    workers = max(1, workers)
+    results = []
+    with (ProcessPoolExecutor(max_workers=workers) if workers > 1 else contextlib.nullcontext()) as executor:
+        stop = min(minReplications, maxReplications)
+        while True:
+            results += _runBatch(executor, factory, len(results), stop, onResult)
+            mean, halfWidth = confidenceInterval([metrics(result) for result in results], level)
+            n = len(results)
+            needed = _replicationsNeeded(n, mean, halfWidth, relWidth)
+            if needed <= n or n >= maxReplications:
+                return results, mean, halfWidth
+            stop = min(needed, 2 * n, maxReplications)
+
+
+def _replicationsNeeded(n:int, mean, halfWidth, relWidth):
+    # replications for every half-width to reach relWidth * |mean|, from n
+    # scaled by the square of the worst ratio of half-width to target
+    worst = 0.0
+    for m, h in zip(np.ravel(mean), np.ravel(halfWidth)):
+        target = relWidth * abs(m)
+        if h > target:
+            worst = max(worst, h / target if target > 0.0 else math.inf)
+    if worst == 0.0:
+        return n
+    if math.isinf(worst):
+        return 2 * n
+    return max(n + 1, math.ceil(n * worst * worst))
+
+
+def paramGrid(**axes):
+    # Every combination of the values of the given axes, as one dict of
+    # keyword arguments per cell, the last axis varying fastest:
+    # paramGrid(k=[1, 2], ro=[0.5, 0.9]) gives k=1,ro=0.5  k=1,ro=0.9  k=2,ro=0.5 ...
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*axes.values())]
+
+
+def runSweep(runCell, cells, workers=None, chunksize=None):
+    # [runCell(cell) for cell in cells], computed in worker processes.
+    # runCell must be picklable like a replication factory and return
+    # something picklable (a results tuple, or the finished States); like a
+    # replication, a cell must seed everything random it uses itself.
+    # One pool serves the whole grid, so workers stay warm from cell to cell,
+    # and cells are sent chunksize at a time (by default about four chunks
+    # per worker) to keep the per-task overhead low.
+    cells = list(cells)
+    if workers is None:
+        workers = availableCores()
+    workers = max(1, min(workers, len(cells)))
+    if workers == 1:
+        return [runCell(cell) for cell in cells]
+
+    if chunksize is None:
+        chunksize = max(1, math.ceil(len(cells) / (4 * workers)))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(runCell, cells, chunksize=chunksize))